@@ -0,0 +1,123 @@
+import json
+import math
+import os
+import sys
+import time
+
+from MILP.instrumentation import solve_cbc
+
+
+def incumbent_writer(path, candidate_points):
+    """
+    on_incumbent callback that keeps the best selection so far on disk:
+    path (GeoJSON) is replaced atomically on every improvement and every event
+    (objective, bound, gap, elapsed time, selected indices) is appended to path + ".jsonl",
+    so an interrupted run still leaves a usable layout.
+    """
+    def write(event):
+        tmp = path + ".tmp"
+        candidate_points.iloc[event["selected_idx"]].to_file(tmp, driver="GeoJSON")
+        os.replace(tmp, path)
+        with open(path + ".jsonl", "a") as f:
+            f.write(json.dumps(event) + "\n")
+    return write
+
+
+def solve_cbc_anytime(problem, model, x, y, time_limit=None, gap_rel=None, threads=None, on_incumbent=None, incumbent=None, msg=False, first_slice=10.0):
+    """
+    Solve a model from build_shade_model within a wall-clock budget and report every
+    improving selection as it is found.
+
+    CBC only hands back its final solution, so with on_incumbent set the budget is
+    spent in time slices (first_slice seconds, doubling) that each restart from the
+    best selection so far as a warm start. Every slice that improves the selection
+    calls on_incumbent({"selected_idx", "objective", "bound", "gap", "elapsed", "source"}).
+    Without a callback CBC runs once with the whole budget.
+    Stops when the time budget is used up, the relative gap drops to gap_rel or
+    optimality is proven. Ctrl+C stops the search and keeps the best selection so far.
+
+    incumbent is an optional starting selection (e.g. from the heuristic), reported first.
+    Returns (selected candidate indices, solver statistics).
+    """
+    start = time.perf_counter()
+    best_idx, best_objective, bound = None, -math.inf, math.inf
+    stats = {}
+    slices = incumbents = 0
+    time_to_first_incumbent = None
+    interrupted = False
+
+    def gap():
+        if best_idx is None or not math.isfinite(bound):
+            return None
+        return max(bound - best_objective, 0.0) / max(abs(best_objective), 1e-9)
+
+    def offer(selected_idx, source):
+        nonlocal best_idx, best_objective, incumbents, time_to_first_incumbent
+        objective = problem.objective(selected_idx)
+        if best_idx is not None and objective <= best_objective + 1e-9:
+            return
+        best_idx, best_objective = list(selected_idx), objective
+        incumbents += 1
+        elapsed = time.perf_counter() - start
+        if time_to_first_incumbent is None:
+            time_to_first_incumbent = elapsed
+        print(f"Incumbent {incumbents} ({source}): objective {objective:.6f} after {elapsed:.2f} s")
+        sys.stdout.flush()
+        if on_incumbent is not None:
+            on_incumbent({
+                "selected_idx": [int(i) for i in best_idx],
+                "objective": objective,
+                "bound": bound if math.isfinite(bound) else None,
+                "gap": gap(),
+                "elapsed": elapsed,
+                "source": source,
+            })
+
+    if incumbent is not None:
+        offer(incumbent, "warm start")
+
+    slice_limit = first_slice
+    try:
+        while True:
+            remaining = None if time_limit is None else time_limit - (time.perf_counter() - start)
+            if remaining is not None and remaining <= 0:
+                break
+            limit = remaining if on_incumbent is None else min(slice_limit, remaining or slice_limit)
+
+            if best_idx is not None:
+                # local import: distance_optimizer imports this module
+                from MILP.distance_optimizer import set_warm_start
+                set_warm_start(x, y, best_idx)
+            stats = solve_cbc(model, msg=msg, timeLimit=limit, gapRel=gap_rel, threads=threads, warmStart=best_idx is not None)
+            slices += 1
+
+            if stats["objective"] is not None:
+                offer([i for i in range(problem.n) if x[i].value() > 0.5], "cbc")
+            # the model minimizes the negated objective
+            if stats["bound"] is not None:
+                bound = min(bound, -stats["bound"])
+            result = stats["result"] or ""
+            if result.startswith("Optimal") and "gap" not in result:
+                bound = best_objective
+            if result.startswith("Optimal") or on_incumbent is None or (gap_rel is not None and gap() is not None and gap() <= gap_rel):
+                break
+            slice_limit *= 2
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Interrupted, keeping the best selection so far")
+        sys.stdout.flush()
+
+    if best_idx is None:
+        raise RuntimeError(f"CBC found no feasible selection ({stats.get('result')})")
+
+    return best_idx, {
+        **stats,
+        "objective": best_objective,
+        "bound": bound if math.isfinite(bound) else None,
+        "gap": gap(),
+        "incumbents": incumbents,
+        "time_to_first_incumbent": time_to_first_incumbent,
+        "slices": slices,
+        "interrupted": interrupted,
+        "wall_seconds": time.perf_counter() - start,
+    }
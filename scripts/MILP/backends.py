@@ -0,0 +1,137 @@
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    from scipy.sparse import csr_array
+except ImportError:  # only needed for the matrix-form (HiGHS) backend
+    milp = None
+
+
+@dataclass
+class ShadeMatrices:
+    """
+    The sparse MILP in matrix form, as a minimization over z = [x_0..x_{n-1}, y_0..y_{m-1}]:
+        min c @ z  s.t.  lower <= A @ z <= upper,  0 <= z <= 1,  x integer
+    where y_k is the "both selected" variable of close pair k (problem.pair_i[k], problem.pair_j[k]).
+    """
+    c: np.ndarray
+    A: "csr_array"
+    lower: np.ndarray
+    upper: np.ndarray
+    integrality: np.ndarray
+    n: int
+
+    @property
+    def variables(self):
+        return len(self.c)
+
+    @property
+    def constraints(self):
+        return self.A.shape[0]
+
+
+def build_shade_matrices(problem, max_shades, aggregate_conflicts=False):
+    """
+    Assemble the same model as build_shade_model(formulation="sparse") straight from
+    the ShadeProblem arrays, without creating a Python object per variable or constraint:
+    - pair rows:        x_i + x_j - y_k <= 1
+    - aggregated rows:  sum_k y_k - sum_j x_j - min(|N(i)|, max_shades) x_i >= -min(|N(i)|, max_shades)
+    - cardinality row:  sum_i x_i = max_shades
+    """
+    if milp is None:
+        raise ImportError("scipy >= 1.9 is required for the matrix-form backend (pip install scipy)")
+
+    n, m = problem.n, len(problem.pair_i)
+    pair_k = np.arange(m)
+
+    # pair rows 0..m-1
+    rows = [np.repeat(pair_k, 3)]
+    cols = [np.column_stack([problem.pair_i, problem.pair_j, n + pair_k]).ravel()]
+    vals = [np.tile([1.0, 1.0, -1.0], m)]
+    lower = [np.full(m, -np.inf)]
+    upper = [np.ones(m)]
+    n_rows = m
+
+    if aggregate_conflicts and m:
+        # one row per candidate with close neighbors, over both orientations of each pair
+        src = np.concatenate([problem.pair_i, problem.pair_j])
+        nbr = np.concatenate([problem.pair_j, problem.pair_i])
+        pair = np.concatenate([pair_k, pair_k])
+        centers, row_of = np.unique(src, return_inverse=True)
+        degree = np.bincount(row_of)
+        big_m = np.minimum(degree, max_shades).astype(np.float64)
+        row_of = row_of + n_rows
+
+        rows += [row_of, row_of, n_rows + np.arange(len(centers))]
+        cols += [n + pair, nbr, centers]
+        vals += [np.ones(len(src)), -np.ones(len(src)), -big_m]
+        lower.append(-big_m)
+        upper.append(np.full(len(centers), np.inf))
+        n_rows += len(centers)
+
+    # cardinality row
+    rows.append(np.full(n, n_rows))
+    cols.append(np.arange(n))
+    vals.append(np.ones(n))
+    lower.append(np.array([float(max_shades)]))
+    upper.append(np.array([float(max_shades)]))
+    n_rows += 1
+
+    A = csr_array(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, n + m),
+    )
+    return ShadeMatrices(
+        c=-np.concatenate([problem.linear, problem.pair_weight]),
+        A=A,
+        lower=np.concatenate(lower),
+        upper=np.concatenate(upper),
+        integrality=np.concatenate([np.ones(n, dtype=np.uint8), np.zeros(m, dtype=np.uint8)]),
+        n=n,
+    )
+
+
+def solve_highs(matrices, msg=False, time_limit=None, gap_rel=None):
+    """
+    Solve ShadeMatrices in-process with HiGHS (scipy.optimize.milp), stopping at the
+    time_limit (seconds) or once the relative gap is below gap_rel.
+    Returns (selected candidate indices, solver statistics).
+    """
+    options = {"disp": msg}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if gap_rel is not None:
+        options["mip_rel_gap"] = gap_rel
+
+    start = time.perf_counter()
+    result = milp(
+        matrices.c,
+        constraints=LinearConstraint(matrices.A, matrices.lower, matrices.upper),
+        integrality=matrices.integrality,
+        bounds=Bounds(0, 1),
+        options=options,
+    )
+    elapsed = time.perf_counter() - start
+    sys.stdout.flush()
+
+    if result.x is None:
+        raise RuntimeError(f"HiGHS found no solution: {result.message}")
+    selected_idx = np.flatnonzero(result.x[:matrices.n] > 0.5).tolist()
+
+    # HiGHS minimizes the negated objective, report values in the maximization sense
+    bound = getattr(result, "mip_dual_bound", None)
+    stats = {
+        # 1 = iteration or time limit reached with a feasible selection
+        "status": "Optimal" if result.status == 0 else "Stopped" if result.status == 1 else "Not Solved",
+        "result": result.message,
+        "objective": -result.fun,
+        "bound": -bound if bound is not None else None,
+        "gap": getattr(result, "mip_gap", None),
+        "nodes": getattr(result, "mip_node_count", None),
+        "solver_seconds": elapsed,
+    }
+    return selected_idx, stats
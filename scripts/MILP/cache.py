@@ -0,0 +1,91 @@
+import hashlib
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/cache"))
+
+
+class ArrayCache:
+    """
+    Content-addressed on-disk cache for precomputed arrays.
+    Every entry is a directory named after the hash of its inputs holding one
+    .npy file per array, so entries load zero-copy with np.load(mmap_mode="r").
+    Entries are evicted least-recently-used once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*arrays, **params):
+        """Hash the contents of the input arrays (e.g. candidate / facility coordinates) plus any scalar parameters."""
+        digest = hashlib.sha256()
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(str((array.dtype.str, array.shape)).encode())
+            digest.update(array.tobytes())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """Return {name: memory-mapped array} for a cached entry, or None on a miss."""
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        arrays = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+        os.utime(path)   # mark as recently used
+        return arrays
+
+    def store(self, key, arrays):
+        """Write {name: array} under key (atomically, via a temporary directory) and evict old entries."""
+        path = self._path(key)
+        if os.path.isdir(path):
+            os.utime(path)
+            return
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another run stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Drop least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            if key.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def get_or_compute(self, key, compute):
+        """Load the entry for key, or call compute() -> {name: array}, store and return it."""
+        arrays = self.load(key)
+        if arrays is None:
+            computed = compute()
+            self.store(key, computed)
+            # an entry larger than max_bytes is evicted right away, hand back the in-memory arrays
+            arrays = self.load(key) or computed
+        return arrays
@@ -0,0 +1,110 @@
+"""
+Columnar GeoParquet store for the raw, preprocessed and layer datasets.
+
+    python data_store.py            # convert every dataset that has a source file
+    python data_store.py schools    # convert selected datasets
+
+Every dataset is stored once as data/parquet/<name>.parquet, already in the
+working CRS, so a run only reads geometry plus the columns it asks for.
+"""
+import os
+import sys
+import time
+
+import geopandas as gpd
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(os.path.join(REPO_ROOT, "scripts"))
+from preprocess_datasets.regions import REGIONS
+STORE_DIR = os.path.join(REPO_ROOT, "data/parquet")
+WORKING_CRS = 3857
+
+# name -> source file (relative to the repo root); "esri" marks ArcGIS query dumps read from their lat/lon attributes
+DATASETS = {
+    # candidates
+    "bus_stops": {"path": "461/data/bus_stops.geojson"},
+    "bus_stops_dtla": {"path": "data/preprocessed/bus_stops_dtla.geojson"},
+    "major_transit_stops": {"path": "data/raw/la_major_transit_stops.geojson", "esri": ("lat", "lon")},
+    "major_transit_stops_dtla": {"path": "data/preprocessed/la_major_transit_stops_dtla.geojson"},
+    # public facilities
+    "schools": {"path": "data/raw/la_schools_colleges_universities.geojson"},
+    "schools_dtla": {"path": "data/preprocessed/la_schools_dtla.geojson"},
+    "hospitals": {"path": "data/raw/la_hospitals_clinics_live.geojson", "esri": ("latitude", "longitude")},
+    "hospitals_dtla": {"path": "data/preprocessed/la_hospitals_clinics_dtla.geojson"},
+    "food": {"path": "data/raw/la_food_assistance.geojson"},
+    "food_dtla": {"path": "data/preprocessed/la_food_assistance_dtla.geojson"},
+    # polygon layers
+    "heat_layer": {"path": "data/layers/heat_layer.geojson"},
+    "socioeconomic_layer": {"path": "data/layers/socioeconomic_layer.geojson"},
+    "below_poverty": {"path": "data/raw/Below_Poverty_tract.geojson"},
+    "social_sensitivity": {"path": "461/data/social_sensitivity.geojson"},
+    "excess_er": {"path": "461/data/la_excess_er.geojson"},
+}
+# polygon layers clipped to a region and simplified by preprocess_datasets/layers.py as <layer>_<region>;
+# until they are prepared, loading one falls back to the full source layer
+for _layer in ("heat_layer", "socioeconomic_layer", "below_poverty", "social_sensitivity", "excess_er"):
+    for _region in REGIONS:
+        DATASETS[f"{_layer}_{_region}"] = {**DATASETS[_layer], "prepared": True}
+
+
+def source_path(name):
+    return os.path.join(REPO_ROOT, DATASETS[name]["path"])
+
+
+def parquet_path(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{name}.parquet")
+
+
+def read_source(name):
+    """Read a dataset from its original file and reproject it to the working CRS."""
+    spec = DATASETS[name]
+    if "esri" in spec:
+        from preprocess_datasets.preprocess import read_esri_points
+        gdf = read_esri_points(source_path(name), *spec["esri"])
+    else:
+        gdf = gpd.read_file(source_path(name))
+    return gdf.to_crs(WORKING_CRS)
+
+
+def convert_to_parquet(names=None, store_dir=STORE_DIR):
+    """Write every dataset (default: all with an existing source file) as GeoParquet in the working CRS."""
+    os.makedirs(store_dir, exist_ok=True)
+    for name in names or list(DATASETS):
+        if DATASETS[name].get("prepared"):
+            if names:
+                print(f"⚠️ Skipping {name}: prepared layers are written by preprocess_datasets/layers.py")
+            continue
+        if not os.path.exists(source_path(name)):
+            print(f"⚠️ Skipping {name}: {DATASETS[name]['path']} not found")
+            continue
+        start = time.perf_counter()
+        gdf = read_source(name)
+        gdf.to_parquet(parquet_path(name, store_dir), write_covering_bbox=True)
+        print(f"✅ {name}: {len(gdf)} rows → {parquet_path(name, store_dir)} ({time.perf_counter() - start:.2f} s)")
+
+
+def _parquet_is_fresh(name, store_dir):
+    path = parquet_path(name, store_dir)
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(source_path(name)) or os.path.getmtime(path) >= os.path.getmtime(source_path(name))
+
+
+def load_dataset(name, columns=None, store_dir=STORE_DIR):
+    """
+    Load a dataset in the working CRS (EPSG:3857).
+    columns limits the attributes read besides geometry (None = all).
+    Reads the GeoParquet copy when it is up to date, otherwise falls back to the source file.
+    """
+    if _parquet_is_fresh(name, store_dir):
+        try:
+            return gpd.read_parquet(parquet_path(name, store_dir), columns=None if columns is None else list(columns) + ["geometry"])
+        except ImportError:
+            print("pyarrow is not installed, reading the source file instead")
+
+    gdf = read_source(name)
+    return gdf if columns is None else gdf[list(columns) + ["geometry"]]
+
+
+if __name__ == "__main__":
+    convert_to_parquet(sys.argv[1:] or None)
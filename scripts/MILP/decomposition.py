@@ -0,0 +1,218 @@
+import multiprocessing
+import numpy as np
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from MILP.distance_optimizer import prepare_shade_problem, solve_shade_problem
+from MILP.heuristic import heuristic_shade_problem
+
+
+def tile_candidates(coords, n_tiles, method="grid", seed=0, iterations=25):
+    """
+    Split candidates into spatial tiles and return one tile label per candidate.
+    - "grid": quantile cuts in x, then in y inside every column, so tiles hold a similar number of candidates
+    - "kmeans": Lloyd's k-means on the coordinates
+    """
+    n = len(coords)
+    n_tiles = max(1, min(n_tiles, n))
+
+    if method == "grid":
+        n_cols = int(np.ceil(np.sqrt(n_tiles)))
+        labels = np.zeros(n, dtype=np.int64)
+        col_order = np.argsort(coords[:, 0], kind="stable")
+        next_label = 0
+        for c, col in enumerate(np.array_split(col_order, n_cols)):
+            # spread the remaining tiles over the remaining columns
+            n_rows = max(1, (n_tiles - next_label) // (n_cols - c))
+            row_order = col[np.argsort(coords[col, 1], kind="stable")]
+            for row in np.array_split(row_order, n_rows):
+                labels[row] = next_label
+                next_label += 1
+        return labels
+
+    if method == "kmeans":
+        rng = np.random.default_rng(seed)
+        centers = coords[rng.choice(n, n_tiles, replace=False)]
+        for _ in range(iterations):
+            d = ((coords[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            labels = d.argmin(axis=1)
+            new_centers = np.array([
+                coords[labels == k].mean(axis=0) if np.any(labels == k) else centers[k]
+                for k in range(n_tiles)
+            ])
+            if np.allclose(new_centers, centers):
+                break
+            centers = new_centers
+        # relabel to 0..k-1 without empty tiles
+        return np.unique(labels, return_inverse=True)[1]
+
+    raise ValueError(f"Unknown tiling method: {method}")
+
+
+def allocate_shades(problem, labels, max_shades):
+    """
+    Give every tile a share of max_shades proportional to its objective mass
+    (sum of the per-candidate rewards), using largest remainders and never more
+    shades than a tile has candidates.
+    """
+    tiles = np.unique(labels)
+    sizes = np.array([np.sum(labels == t) for t in tiles])
+    mass = np.array([problem.linear[labels == t].sum() for t in tiles], dtype=np.float64)
+    if mass.sum() <= 0:
+        mass = sizes.astype(np.float64)
+
+    quota = np.zeros(len(tiles), dtype=np.int64)
+    remaining = min(max_shades, int(sizes.sum()))
+    while remaining > 0:
+        open_tiles = quota < sizes
+        share = np.where(open_tiles, mass, 0.0)
+        share = remaining * share / share.sum() if share.sum() > 0 else remaining * open_tiles / open_tiles.sum()
+        add = np.minimum(np.floor(share).astype(np.int64), sizes - quota)
+        if add.sum() == 0:
+            # hand out the leftovers one by one by largest remainder
+            add[np.argmax(np.where(open_tiles, share - np.floor(share), -1))] = 1
+        quota += add
+        remaining -= int(add.sum())
+    return dict(zip(tiles.tolist(), quota.tolist()))
+
+
+def _solve_tile(args):
+    sub_problem, tile_idx, quota, formulation, aggregate_conflicts, warm_start, backend = args
+    start = time.perf_counter()
+    incumbent = heuristic_shade_problem(sub_problem, quota) if warm_start and backend == "cbc" else None
+    selected = solve_shade_problem(sub_problem, quota, formulation=formulation, aggregate_conflicts=aggregate_conflicts, threads=1, warm_start=incumbent, backend=backend)
+    return [int(tile_idx[i]) for i in selected], time.perf_counter() - start
+
+
+def repair_border_conflicts(problem, selected_idx, labels, max_rounds=None):
+    """
+    Fix spacing conflicts between shades of different tiles with improving
+    1-swaps: a conflicting shade is replaced by the unselected candidate with
+    the best marginal value, as long as the total objective goes up.
+    Returns (selected_idx, number of swaps).
+    """
+    mask = np.zeros(problem.n, dtype=bool)
+    mask[list(selected_idx)] = True
+    indptr, indices, weights = problem.neighbor_lists()
+    max_rounds = max_rounds if max_rounds is not None else 2 * max(1, int(mask.sum()))
+
+    swaps = 0
+    for _ in range(max_rounds):
+        both = mask[problem.pair_i] & mask[problem.pair_j]
+        border = both & (labels[problem.pair_i] != labels[problem.pair_j])
+        if not border.any():
+            break
+
+        inter = problem.interaction(mask)
+        contribution = problem.linear + inter
+        conflicted = np.unique(np.concatenate([problem.pair_i[border], problem.pair_j[border]]))
+
+        improved = False
+        for s in conflicted[np.argsort(contribution[conflicted])]:
+            # value of every unselected candidate once s is removed
+            value = contribution.copy()
+            row = slice(indptr[s], indptr[s + 1])
+            value[indices[row]] -= weights[row]
+            value[mask] = -np.inf
+            u = int(np.argmax(value))
+            if value[u] > contribution[s] + 1e-9:
+                mask[s], mask[u] = False, True
+                swaps += 1
+                improved = True
+                break
+        if not improved:
+            break
+
+    return np.flatnonzero(mask).tolist(), swaps
+
+
+def optimize_shade_placement_decomposed(candidate_points, public_points, max_shades=15, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True, n_tiles=None, tiling="grid", workers=None, formulation="sparse", aggregate_conflicts=False, warm_start=False, compare_monolithic=False, cache=None, backend="cbc"):
+    """
+    Spatially decomposed version of optimize_shade_placement for county-scale runs:
+    - split candidates into tiles (grid or k-means)
+    - give each tile a share of max_shades based on its objective mass
+    - solve the tiles concurrently in a process pool
+    - repair spacing conflicts along tile borders
+    Returns (selected candidate_points, report). With compare_monolithic=True the
+    report also holds the monolithic objective and the relative gap (use on DTLA-sized inputs).
+    backend picks the tile solver, "cbc" or "highs" (see optimize_shade_placement).
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    n_tiles = n_tiles or workers
+
+    problem = prepare_shade_problem(
+        candidate_points, public_points,
+        spacing_threshold=spacing_threshold,
+        public_service_threshold=public_service_threshold,
+        use_spacing=use_spacing,
+        use_public=use_public,
+        use_heat=use_heat,
+        use_socioeconomic=use_socioeconomic,
+        cache=cache,
+    )
+    precompute_time = time.perf_counter() - start
+
+    labels = tile_candidates(problem.candidate_coords, n_tiles, method=tiling)
+    quotas = allocate_shades(problem, labels, max_shades)
+    print(f"Tiles: {len(quotas)}, shades per tile: {quotas}")
+    sys.stdout.flush()
+
+    # --- SOLVE TILES ---
+    jobs = []
+    for tile, quota in quotas.items():
+        if quota == 0:
+            continue
+        tile_idx = np.flatnonzero(labels == tile)
+        jobs.append((problem.subset(tile_idx), tile_idx, quota, formulation, aggregate_conflicts, warm_start, backend))
+
+    solve_start = time.perf_counter()
+    selected_idx, tile_times = [], []
+    # fork where available so scripts without a __main__ guard (like main.py) are not re-imported by the workers
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for tile_selected, tile_time in pool.map(_solve_tile, jobs):
+            selected_idx.extend(tile_selected)
+            tile_times.append(tile_time)
+    solve_time = time.perf_counter() - solve_start
+
+    # --- REPAIR TILE BORDERS ---
+    objective_before_repair = problem.objective(selected_idx)
+    both = np.isin(problem.pair_i, selected_idx) & np.isin(problem.pair_j, selected_idx)
+    border_conflicts_before = int(np.sum(both & (labels[problem.pair_i] != labels[problem.pair_j])))
+    selected_idx, swaps = repair_border_conflicts(problem, selected_idx, labels)
+    both = np.isin(problem.pair_i, selected_idx) & np.isin(problem.pair_j, selected_idx)
+
+    report = {
+        "n": problem.n,
+        "p": problem.p,
+        "max_shades": max_shades,
+        "tiling": tiling,
+        "n_tiles": len(quotas),
+        "workers": workers,
+        "backend": backend,
+        "quotas": {str(k): v for k, v in quotas.items()},
+        "objective": problem.objective(selected_idx),
+        "objective_before_repair": objective_before_repair,
+        "border_conflicts_before_repair": border_conflicts_before,
+        "border_conflicts": int(np.sum(both & (labels[problem.pair_i] != labels[problem.pair_j]))),
+        "repair_swaps": swaps,
+        "precompute_time": precompute_time,
+        "solve_time": solve_time,
+        "max_tile_time": max(tile_times, default=0.0),
+        "wall_time": time.perf_counter() - start,
+    }
+
+    if compare_monolithic:
+        mono_start = time.perf_counter()
+        mono_idx = solve_shade_problem(problem, max_shades, formulation=formulation, aggregate_conflicts=aggregate_conflicts, backend=backend)
+        report["monolithic_objective"] = problem.objective(mono_idx)
+        report["monolithic_time"] = time.perf_counter() - mono_start
+        report["gap"] = (report["monolithic_objective"] - report["objective"]) / max(abs(report["monolithic_objective"]), 1e-8)
+
+    print("Decomposition report:", report)
+    sys.stdout.flush()
+
+    return candidate_points.iloc[selected_idx], report
@@ -1,162 +1,565 @@
-import geopandas as gpd
 import numpy as np
 import itertools
 import sys
-from pulp import LpProblem, LpVariable, LpMaximize, lpSum, LpBinary, PULP_CBC_CMD
+from dataclasses import dataclass, replace
+from pulp import LpProblem, LpVariable, LpMinimize, lpSum, LpBinary
 
-def optimize_shade_placement(candidate_points, public_points, max_shades=15, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True):
+from MILP.distances import point_coords, distance_matrix, radius_pairs, radius_neighbors
+from MILP.instrumentation import RunRecorder, solve_cbc
+from MILP.backends import build_shade_matrices, solve_highs
+
+# objective weights
+SPACING_WEIGHT = 1.0
+PUBLIC_WEIGHT = 0.1
+HEAT_WEIGHT = 0.02
+SOCIOECONOMIC_WEIGHT = 0.02
+
+# A higher value means that we care a lot about how close the service is to the public facility. A lower value means that we just care if it is covered under the public_facility_threshold.
+PUBLIC_SERVICE_DISTANCE_WEIGHTING = 0.2
+
+
+def _normalize(values, label):
+    """Min-max normalize to [0, 1]. Candidates without a value (e.g. outside every polygon of a layer) score 0."""
+    values = np.asarray(values, dtype=np.float64)
+    values = (values - np.nanmin(values)) / (np.nanmax(values) - np.nanmin(values) + 1e-8)
+    values = np.nan_to_num(values, nan=0.0)
+    assert np.min(values) >= 0 and np.max(values) <= 1, \
+        f"{label} normalization error: min={np.min(values)}, max={np.max(values)}"
+    return values
+
+
+@dataclass
+class ShadeProblem:
+    """
+    Everything the MILP needs, precomputed from the candidate / public points:
+    - pair_i, pair_j, pair_dist: candidate pairs closer than spacing_threshold (i < j)
+    - pair_weight: spacing penalty of selecting both ends of a pair (<= 0)
+    - coverage_indptr, coverage_indices, coverage_dist: CSR index of the public facilities
+      within public_service_threshold of each candidate; candidate i covers facilities
+      coverage_indices[coverage_indptr[i]:coverage_indptr[i + 1]] at distances coverage_dist[...]
+    - linear: per-candidate reward (public coverage + heat + socioeconomic terms)
+    """
+    candidate_coords: np.ndarray
+    public_coords: np.ndarray
+    coverage_indptr: np.ndarray
+    coverage_indices: np.ndarray
+    coverage_dist: np.ndarray
+    pair_i: np.ndarray
+    pair_j: np.ndarray
+    pair_dist: np.ndarray
+    pair_weight: np.ndarray
+    public_score: np.ndarray
+    heat_score: np.ndarray
+    socio_score: np.ndarray
+    linear: np.ndarray
+    spacing_threshold: float
+    public_service_threshold: float
+
+    @property
+    def n(self):
+        return len(self.candidate_coords)
+
+    @property
+    def p(self):
+        return len(self.public_coords)
+
+    def objective(self, selected_idx):
+        """Objective value of a selection, identical to the MILP objective."""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[list(selected_idx)] = True
+        both = mask[self.pair_i] & mask[self.pair_j]
+        return float(self.linear[mask].sum() + self.pair_weight[both].sum())
+
+    def spacing_penalty(self):
+        """Unweighted spacing penalty -1 + d / spacing_threshold of every close pair."""
+        return -1 + self.pair_dist.astype(np.float64) / self.spacing_threshold
+
+    def reweighted(self, spacing=SPACING_WEIGHT, public=PUBLIC_WEIGHT, heat=HEAT_WEIGHT, socioeconomic=SOCIOECONOMIC_WEIGHT):
+        """Copy of the problem with other objective weights; the distance and coverage arrays are shared."""
+        # the sparse model's single y_ij >= x_i + x_j - 1 constraint needs pair weights <= 0
+        if spacing < 0:
+            raise ValueError(f"The spacing weight must not be negative, not {spacing}")
+        return replace(
+            self,
+            pair_weight=spacing * self.spacing_penalty(),
+            linear=public * self.public_score + heat * self.heat_score + socioeconomic * self.socio_score,
+        )
+
+    def term_scores(self, selected_idx):
+        """Unweighted value of every objective term for a selection (all are maximized)."""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[list(selected_idx)] = True
+        both = mask[self.pair_i] & mask[self.pair_j]
+        return {
+            "spacing": float(self.spacing_penalty()[both].sum()),
+            "public": float(self.public_score[mask].sum()),
+            "heat": float(self.heat_score[mask].sum()),
+            "socioeconomic": float(self.socio_score[mask].sum()),
+        }
+
+    def neighbor_lists(self):
+        """
+        Symmetric CSR-style adjacency of the close pairs: the neighbors of i are
+        indices[indptr[i]:indptr[i + 1]] with spacing weights weights[indptr[i]:indptr[i + 1]].
+        """
+        src = np.concatenate([self.pair_i, self.pair_j])
+        dst = np.concatenate([self.pair_j, self.pair_i])
+        weights = np.concatenate([self.pair_weight, self.pair_weight])
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.n), out=indptr[1:])
+        return indptr, dst[order], weights[order]
+
+    def coverage_entries(self, idx):
+        """Positions in coverage_indices / coverage_dist of the (candidate, facility) entries of the candidates in idx."""
+        idx = np.asarray(idx, dtype=np.int64)
+        starts, counts = self.coverage_indptr[idx], self.coverage_indptr[idx + 1] - self.coverage_indptr[idx]
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(starts, counts) + np.arange(counts.sum()) - offsets
+
+    def interaction(self, mask):
+        """For every candidate, the summed spacing weight to the selected candidates in `mask`."""
+        inter = np.zeros(self.n)
+        np.add.at(inter, self.pair_i[mask[self.pair_j]], self.pair_weight[mask[self.pair_j]])
+        np.add.at(inter, self.pair_j[mask[self.pair_i]], self.pair_weight[mask[self.pair_i]])
+        return inter
+
+    def subset(self, idx):
+        """Restrict the problem to the candidates in `idx` (renumbered 0..len(idx)-1), keeping the global scores."""
+        idx = np.asarray(idx, dtype=np.int64)
+        remap = np.full(self.n, -1, dtype=np.int64)
+        remap[idx] = np.arange(len(idx))
+        keep = (remap[self.pair_i] >= 0) & (remap[self.pair_j] >= 0)
+        sub_i, sub_j = remap[self.pair_i[keep]], remap[self.pair_j[keep]]
+        swap = sub_i > sub_j
+        sub_i[swap], sub_j[swap] = sub_j[swap], sub_i[swap]
+        entries = self.coverage_entries(idx)
+        coverage_indptr = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(self.coverage_indptr[idx + 1] - self.coverage_indptr[idx], out=coverage_indptr[1:])
+        return ShadeProblem(
+            candidate_coords=self.candidate_coords[idx],
+            public_coords=self.public_coords,
+            coverage_indptr=coverage_indptr,
+            coverage_indices=self.coverage_indices[entries],
+            coverage_dist=self.coverage_dist[entries],
+            pair_i=sub_i,
+            pair_j=sub_j,
+            pair_dist=self.pair_dist[keep],
+            pair_weight=self.pair_weight[keep],
+            public_score=self.public_score[idx],
+            heat_score=self.heat_score[idx],
+            socio_score=self.socio_score[idx],
+            linear=self.linear[idx],
+            spacing_threshold=self.spacing_threshold,
+            public_service_threshold=self.public_service_threshold,
+        )
+
+
+def compute_spacing_pairs(candidate_coords, spacing_threshold):
+    # candidate pairs inside the spacing radius (in meters)
+    pair_i, pair_j, pair_dist = radius_pairs(candidate_coords, spacing_threshold)
+    return {"pair_i": pair_i, "pair_j": pair_j, "pair_dist": pair_dist}
+
+
+def compute_public_coverage(candidate_coords, public_coords, public_service_threshold):
+    n = len(candidate_coords)
+
+    # candidate -> public site pairs inside the service radius, as a CSR index (rows come sorted)
+    rows, coverage_indices, coverage_dist = radius_neighbors(candidate_coords, public_coords, public_service_threshold)
+    coverage_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=coverage_indptr[1:])
+
+    # calculates how valuable each bus stop is when considering proximity to public services
+    # encourages both threshold coverage of + closeness to public services
+    # adding the 1 encourages general coverage and the the subtraction term penalizes shades that are relatively far from the public services they cover
+    weights = 1 - (coverage_dist.astype(np.float64) / public_service_threshold * PUBLIC_SERVICE_DISTANCE_WEIGHTING)
+    public_dist_coverage = np.bincount(rows, weights=weights, minlength=n)
+    return {
+        "coverage_indptr": coverage_indptr,
+        "coverage_indices": coverage_indices,
+        "coverage_dist": coverage_dist,
+        "public_dist_coverage": public_dist_coverage,
+    }
+
+
+def prepare_shade_problem(candidate_points, public_points, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True, cache=None):
+    """
+    Precompute distances and per-candidate scores for optimize_shade_placement.
+    Only candidate pairs inside the spacing radius are kept, since pairs further
+    apart never contribute to the spacing term.
+    With an ArrayCache (MILP.cache) the distance and coverage arrays are reused
+    whenever the candidate / facility geometries and thresholds are unchanged.
+    """
+    # pull coordinates and layer values out of the GeoDataFrames once
+    return prepare_shade_problem_arrays(
+        point_coords(candidate_points), point_coords(public_points),
+        heat_values=candidate_points.heat_layer.to_numpy() if use_heat else None,
+        socioeconomic_values=candidate_points.socioeconomic_layer.to_numpy() if use_socioeconomic else None,
+        spacing_threshold=spacing_threshold,
+        public_service_threshold=public_service_threshold,
+        use_spacing=use_spacing,
+        use_public=use_public,
+        cache=cache,
+    )
+
+
+def prepare_shade_problem_arrays(candidate_coords, public_coords, heat_values=None, socioeconomic_values=None, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, cache=None, spacing=None, coverage=None):
+    """
+    prepare_shade_problem on plain arrays: (n, 2) candidate and (p, 2) public
+    coordinates in meters, plus the raw heat / socioeconomic values per candidate
+    (None leaves that term out of the objective).
+    spacing / coverage: the compute_spacing_pairs / compute_public_coverage results
+    for these coordinates and thresholds, when the caller already has them.
+    """
+    n = len(candidate_coords)
+
+    if spacing is None:
+        if cache is None:
+            spacing = compute_spacing_pairs(candidate_coords, spacing_threshold)
+        else:
+            spacing = cache.get_or_compute(
+                cache.key(candidate_coords, kind="spacing_pairs", spacing_threshold=spacing_threshold, compare="float64"),
+                lambda: compute_spacing_pairs(candidate_coords, spacing_threshold),
+            )
+    if coverage is None:
+        if cache is None:
+            coverage = compute_public_coverage(candidate_coords, public_coords, public_service_threshold)
+        else:
+            coverage = cache.get_or_compute(
+                cache.key(candidate_coords, public_coords, kind="public_coverage_csr",
+                          public_service_threshold=public_service_threshold,
+                          distance_weighting=PUBLIC_SERVICE_DISTANCE_WEIGHTING, compare="float64"),
+                lambda: compute_public_coverage(candidate_coords, public_coords, public_service_threshold),
+            )
+    pair_i, pair_j, pair_dist = spacing["pair_i"], spacing["pair_j"], spacing["pair_dist"]
+    public_dist_coverage = coverage["public_dist_coverage"]
+
+    # encourage spacing: selecting both ends of a close pair costs -1 + d / spacing_threshold
+    # (multiplied by y_ij in the sparse model; the original objective, formulation="dense", sums it as a constant)
+    if use_spacing:
+        pair_weight = SPACING_WEIGHT * (-1 + pair_dist.astype(np.float64) / spacing_threshold)
+    else:
+        pair_i, pair_j, pair_dist = pair_i[:0], pair_j[:0], pair_dist[:0]
+        pair_weight = np.zeros(0)
+
+    # normalize terms to [0,1]
+    public_score = _normalize(public_dist_coverage, "Public") if use_public else np.zeros(n)
+    heat_score = _normalize(heat_values, "Heat") if heat_values is not None else np.zeros(n)
+    socio_score = _normalize(socioeconomic_values, "Socioeconomic") if socioeconomic_values is not None else np.zeros(n)
+
+    linear = PUBLIC_WEIGHT * public_score + HEAT_WEIGHT * heat_score + SOCIOECONOMIC_WEIGHT * socio_score
+
+    return ShadeProblem(
+        candidate_coords=candidate_coords,
+        public_coords=public_coords,
+        coverage_indptr=coverage["coverage_indptr"],
+        coverage_indices=coverage["coverage_indices"],
+        coverage_dist=coverage["coverage_dist"],
+        pair_i=pair_i,
+        pair_j=pair_j,
+        pair_dist=pair_dist,
+        pair_weight=pair_weight,
+        public_score=public_score,
+        heat_score=heat_score,
+        socio_score=socio_score,
+        linear=linear,
+        spacing_threshold=spacing_threshold,
+        public_service_threshold=public_service_threshold,
+    )
+
+
+def build_shade_model(problem, max_shades, formulation="sparse", aggregate_conflicts=False):
+    """
+    Build the PuLP model for a prepared ShadeProblem.
+
+    formulation="sparse" only creates y_ij for pairs inside the spacing radius.
+    Their objective weight is negative, so the single constraint
+    y_ij >= x_i + x_j - 1 is enough to make y_ij = x_i AND x_j at the optimum,
+    and y_ij can be continuous.
+    formulation="dense" reproduces the original model: a binary y_ij and three
+    linearization constraints for every pair, and its objective.
+
+    The two formulations optimize different objectives. The original model added
+    -1 + d_ij / spacing_threshold for every close pair as a constant (y_ij was only
+    tested for truthiness, never multiplied), so spacing did not affect which shades
+    were picked; "dense" keeps that objective, so it reproduces the committed
+    data/optimized_shades_* outputs. "sparse" (the default) penalizes the close pairs
+    that are actually selected, sum w_ij * y_ij, as ShadeProblem.objective does.
+    Selections and objective values of the two are not comparable.
+
+    aggregate_conflicts adds, per candidate i with close neighbors N(i),
+        sum_j y_ij >= sum_j x_j - min(|N(i)|, max_shades) * (1 - x_i)
+    which is tighter than the summed pairwise constraints when |N(i)| > max_shades.
+
+    Returns (model, x, y).
+    """
+    n = problem.n
+    # stated as minimizing the negated objective: CBC (-max) misreads the sign of a
+    # MIP start on maximization models and drops the warm-start incumbent
+    model = LpProblem("Shade_Placement", LpMinimize)
+
+    # binary variables for shade selection
+    x = LpVariable.dicts("x", range(n), cat=LpBinary)
+
+    # pairwise "both selected" variables for distance penalty
+    y = {}
+    if formulation == "dense":
+        for i, j in itertools.combinations(range(n), 2):
+            y[(i, j)] = LpVariable(f"y_{i}_{j}", cat=LpBinary)
+        for (i, j) in y.keys():
+            model += y[(i, j)] <= x[i]
+            model += y[(i, j)] <= x[j]
+            model += y[(i, j)] >= x[i] + x[j] - 1
+    elif formulation == "sparse":
+        for i, j in zip(problem.pair_i.tolist(), problem.pair_j.tolist()):
+            y[(i, j)] = LpVariable(f"y_{i}_{j}", lowBound=0, upBound=1)
+            model += y[(i, j)] >= x[i] + x[j] - 1
+    else:
+        raise ValueError(f"Unknown formulation: {formulation}")
+
+    if aggregate_conflicts:
+        neighbors = {}
+        for i, j in zip(problem.pair_i.tolist(), problem.pair_j.tolist()):
+            neighbors.setdefault(i, []).append(j)
+            neighbors.setdefault(j, []).append(i)
+        for i, near in neighbors.items():
+            big_m = min(len(near), max_shades)
+            model += (
+                lpSum(y[(min(i, j), max(i, j))] for j in near)
+                >= lpSum(x[j] for j in near) - big_m * (1 - x[i])
+            )
+
+    # max shade constraint
+    model += lpSum([x[i] for i in range(n)]) == max_shades, "max_shades"
+
+    # OBJECTIVE
+    if formulation == "dense":
+        # the original spacing term: a constant over all close pairs, independent of the selection
+        spacing_term = float(problem.pair_weight.sum())
+    else:
+        spacing_term = lpSum([
+            w * y[(i, j)]
+            for i, j, w in zip(problem.pair_i.tolist(), problem.pair_j.tolist(), problem.pair_weight.tolist())
+        ])
+    linear_term = lpSum([problem.linear[i] * x[i] for i in range(n) if problem.linear[i] != 0])
+    model += -(spacing_term + linear_term)
+
+    return model, x, y
+
+
+def set_warm_start(x, y, selected_idx):
+    """Load a selection (e.g. from the heuristic) as the CBC incumbent; solve with PULP_CBC_CMD(warmStart=True)."""
+    selected = set(int(i) for i in selected_idx)
+    for i, var in x.items():
+        var.setInitialValue(1 if i in selected else 0)
+    for (i, j), var in y.items():
+        var.setInitialValue(1 if i in selected and j in selected else 0)
+
+
+def solve_shade_problem(problem, max_shades, formulation="sparse", aggregate_conflicts=False, msg=False, threads=None, warm_start=None, backend="cbc", time_limit=None, gap_rel=None, return_stats=False):
+    """
+    Build and solve the MILP for a prepared ShadeProblem, returning the selected candidate indices.
+    warm_start is an optional list of selected indices used as the starting incumbent (CBC only).
+    backend="highs" builds the sparse model in matrix form and solves it in-process (MILP.backends).
+    time_limit (seconds) and gap_rel stop the solver early with the best selection found so far.
+    With return_stats=True returns (selected indices, solver statistics), where
+    stats["stopped_early"] is set when the search ended without proving optimality or
+    reaching gap_rel (e.g. on the time limit).
+    """
+    if backend == "highs":
+        _check_highs_formulation(formulation)
+        matrices = build_shade_matrices(problem, max_shades, aggregate_conflicts=aggregate_conflicts)
+        selected_idx, stats = solve_highs(matrices, msg=msg, time_limit=time_limit, gap_rel=gap_rel)
+        stats["stopped_early"] = stats["status"] != "Optimal"
+    elif backend == "cbc":
+        model, x, y = build_shade_model(problem, max_shades, formulation=formulation, aggregate_conflicts=aggregate_conflicts)
+        if warm_start is not None:
+            set_warm_start(x, y, warm_start)
+        stats = solve_cbc(model, msg=msg, threads=threads, warmStart=warm_start is not None, timeLimit=time_limit, gapRel=gap_rel)
+        # PuLP reports a solve cut off by the time limit as "Optimal", CBC's own result line does not
+        stats["stopped_early"] = not (stats["result"] or "").startswith("Optimal")
+        selected_idx = [i for i in range(problem.n) if x[i].value() > 0.5]
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    return (selected_idx, stats) if return_stats else selected_idx
+
+
+def _check_highs_formulation(formulation):
+    if formulation != "sparse":
+        raise ValueError(f"The highs backend only builds the sparse formulation, not {formulation!r}")
+
+
+def solution_metrics(problem, selected_idx):
+    """
+    Success metrics of a selection: close shade pairs, (shade, public facility) pairs
+    within the service threshold, and distinct facilities covered by at least one shade.
+    """
+    selected_idx = np.asarray(selected_idx, dtype=np.int64)
+
+    # Count of shade pairs < spacing_threshold
+    count_close_pairs = len(radius_pairs(problem.candidate_coords[selected_idx], problem.spacing_threshold)[0])
+
+    # Count of public facilities within threshold (a facility near two shades counts twice)
+    covered = problem.coverage_indices[problem.coverage_entries(selected_idx)]
+
+    return {
+        "count_close_pairs": int(count_close_pairs),
+        "covered_facilities": int(len(covered)),
+        "unique_facilities_covered": int(len(np.unique(covered))),
+    }
+
+
+def optimize_shade_placement(candidate_points, public_points, max_shades=15, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True, formulation="sparse", aggregate_conflicts=False, warm_start=False, cache=None, recorder=None, backend="cbc", time_limit=None, gap_rel=None, threads=None, on_incumbent=None, merge_radius=None, weights=None):
     """
     MILP to select shade locations:
     - maximize coverage near public buildings (schools, hospitals, food)
     - maximize spacing between shades
+    With warm_start=True the heuristic solution (lazy greedy + swap search) is given to CBC as the first incumbent.
+    backend="cbc" builds the model through PuLP and solves it with CBC; backend="highs" assembles
+    the objective vector and sparse constraint matrix from the NumPy arrays and solves it
+    in-process with HiGHS (scipy.optimize.milp), which has no warm start.
+    time_limit (seconds), gap_rel (relative gap target) and threads bound the solve; the
+    best selection found within the budget is returned. on_incumbent is called with every
+    improving selection and its objective / bound while the solver runs (MILP.anytime,
+    e.g. incumbent_writer to keep the best layout on disk). HiGHS reports only its final selection
+    and ignores threads.
+    weights overrides the objective weights, e.g. {"public": 0.2, "heat": 0.05} (ShadeProblem.reweighted).
+    merge_radius (meters) solves a reduced problem instead (MILP.reduction): candidates within
+    merge_radius of a better one are merged, dominated candidates are dropped, and every pick
+    is refined to the best stop of its cluster afterwards.
+    cache is an optional MILP.cache.ArrayCache for the precomputed distance / coverage arrays.
+    recorder is an optional MILP.instrumentation.RunRecorder that gets one record per stage
+    (prepare, reduce, build_model, warm_start, solve, refine, metrics) with its time, memory, model size and solver statistics.
     """
 
     n = len(candidate_points)
     p = len(public_points)
+    recorder = recorder or RunRecorder(trace_memory=False)
 
     print("n: ", n, " p: ", p)
     sys.stdout.flush()
 
-    # binary variables for shade selection
-    x = LpVariable.dicts("x", range(n), cat=LpBinary)
-
-    # pairwise "both selected" variables for distance penalty
-    y = {}
-    for i, j in itertools.combinations(range(n), 2):
-        y[(i, j)] = LpVariable(f"y_{i}_{j}", cat=LpBinary)
-
-    # precompute distances (in meters)
-    dist_matrix = np.zeros((n, n))
-    for i, j in itertools.combinations(range(n), 2):
-        d = candidate_points.geometry.iloc[i].distance(candidate_points.geometry.iloc[j])
-        dist_matrix[i, j] = d
-        dist_matrix[j, i] = d
-
-    # distances from candidates to nearest public site
-    public_dists = np.zeros((n, p))
-    for i in range(n):
-        for j in range(p):
-            public_dists[i, j] = candidate_points.geometry.iloc[i].distance(public_points.geometry.iloc[j])
-
-    # calculates how valuable each bus stop is when considering proximity to public services
-    # encourages both threshold coverage of + closeness to public services
-    # adding the 1 encourages general coverage and the the subtraction term penalizes shades that are relatively far from the public services they cover
-    public_dist_coverage = np.zeros(n)
-    public_service_distance_weighting = 0.2     # A higher value means that we care a lot about how close the service is to the public facility. A lower value means that we just care if it is covered under the public_facility_threshold.
-    for i in range(n): 
-        public_dist_coverage[i] = sum(
-            (1 - (d/public_service_threshold*public_service_distance_weighting))
-            for d in public_dists[i] 
-            if d < public_service_threshold
+    with recorder.stage("prepare", n=n, p=p) as record:
+        problem = prepare_shade_problem(
+            candidate_points, public_points,
+            spacing_threshold=spacing_threshold,
+            public_service_threshold=public_service_threshold,
+            use_spacing=use_spacing,
+            use_public=use_public,
+            use_heat=use_heat,
+            use_socioeconomic=use_socioeconomic,
+            cache=cache,
         )
-
+        if weights:
+            problem = problem.reweighted(**weights)
+        record["close_pairs"] = len(problem.pair_i)
     # --- PRINT STATISTICS ---
-    upper_tri = dist_matrix[np.triu_indices(n, k=1)]
-    dist_stats = (
-        f"Candidate distances stats (upper tri) — min: {upper_tri.min():.2f} m, "
-        f"max: {upper_tri.max():.2f} m, "
-        f"mean: {upper_tri.mean():.2f} m, "
-        f"median: {np.median(upper_tri):.2f} m\n"
-    )
+    if formulation == "dense":
+        upper_tri = distance_matrix(problem.candidate_coords)[np.triu_indices(n, k=1)]
+        dist_stats = (
+            f"Candidate distances stats (upper tri) — min: {upper_tri.min():.2f} m, "
+            f"max: {upper_tri.max():.2f} m, "
+            f"mean: {upper_tri.mean():.2f} m, "
+            f"median: {np.median(upper_tri):.2f} m\n"
+        )
+    else:
+        close = problem.pair_dist if len(problem.pair_dist) else np.zeros(1)
+        dist_stats = (
+            f"Candidate pairs within {spacing_threshold} m: {len(problem.pair_dist)} "
+            f"(of {n * (n - 1) // 2}) — min: {close.min():.2f} m, "
+            f"mean: {close.mean():.2f} m, "
+            f"median: {np.median(close):.2f} m\n"
+        )
 
+    covering = problem.coverage_dist if len(problem.coverage_dist) else np.zeros(1)
     public_stats = (
-        f"Public distances stats — min: {public_dists.min():.2f} m, "
-        f"max: {public_dists.max():.2f} m, "
-        f"mean: {public_dists.mean():.2f} m, "
-        f"median: {np.median(public_dists):.2f} m\n"
+        f"Candidate-facility pairs within {public_service_threshold} m: {len(problem.coverage_dist)} "
+        f"(of {n * problem.p}), candidates covering a facility: {int(np.sum(np.diff(problem.coverage_indptr) > 0))} — "
+        f"min: {covering.min():.2f} m, "
+        f"mean: {covering.mean():.2f} m, "
+        f"median: {np.median(covering):.2f} m\n"
     )
 
     print("dist_stats: ", dist_stats, "\npublic_stats: ", public_stats)
     sys.stdout.flush()
 
-    # --- OBJECTIVE ---
-    # encourage spacing (maximize distance between selected pairs)
-    spacing_term = lpSum([
-        -1 + (dist_matrix[i, j] / spacing_threshold)
-        for (i, j) in y.keys() if y[(i, j)] and dist_matrix[i, j] < spacing_threshold
-    ])
-    
-
-    # --- CONSTRUCT MODEL ---
-    
-    model = LpProblem("Shade_Placement", LpMaximize)
-
-    # CONSTRAINTS
-    # linearize y_ij = x_i AND x_j
-    for (i, j) in y.keys():
-        model += y[(i, j)] <= x[i]
-        model += y[(i, j)] <= x[j]
-        model += y[(i, j)] >= x[i] + x[j] - 1
-    # max shade constraint
-    model += lpSum([x[i] for i in range(n)]) == max_shades
-
-    # OBJECTIVES
-    objective = 0
-    if use_spacing: 
-        objective += 1.0 * spacing_term
-
-    if use_public:         # encourage closeness to public buildings (minimize distance)
-        # normalize terms to [0,1]
-        public_dist_coverage = (public_dist_coverage - np.min(public_dist_coverage)) / (np.max(public_dist_coverage) - np.min(public_dist_coverage) + 1e-8)
-        assert np.min(public_dist_coverage) >= 0 and np.max(public_dist_coverage) <= 1, \
-        f"Normalization error: min={np.min(public_dist_coverage)}, max={np.max(public_dist_coverage)}"
-
-        # add public proximity term
-        public_proximity_term = lpSum([
-            x[i] * public_dist_coverage[i] 
-            for i in range(len(candidate_points))
-        ])
-        objective += 0.1 * public_proximity_term
-
-    if use_heat:            # encourage shades in areas with high heat indexes
-        # normalize terms to [0,1]
-        heat_values = candidate_points.heat_layer
-        heat_values = (heat_values - heat_values.min()) / (heat_values.max() - heat_values.min() + 1e-8)
-        assert np.min(heat_values) >= 0 and np.max(heat_values) <= 1, \
-            f"Heat normalization error: min={np.min(heat_values)}, max={np.max(heat_values)}"
-
-        # add heat term
-        heat_term = lpSum([
-            x[i] * heat_values.iloc[i] 
-            for i in range(len(candidate_points))
-        ])
-        objective += 0.02 * heat_term
-
-    if use_socioeconomic:   # encourage shades in areas with low socioeconomic status
-        # normalize terms to [0,1]
-        socio_values = candidate_points.socioeconomic_layer
-        socio_values = (socio_values - socio_values.min()) / (socio_values.max() - socio_values.min() + 1e-8)
-        assert np.min(socio_values) >= 0 and np.max(socio_values) <= 1, \
-            f"Socioeconomic normalization error: min={np.min(socio_values)}, max={np.max(socio_values)}"
-
-        # add socioeconomic term
-        socio_term = lpSum([
-            x[i] * socio_values.iloc[i] 
-            for i in range(len(candidate_points))
-        ])
+    # --- REDUCE ---
+    # the MILP is built over model_problem, the metrics are computed on the full problem
+    model_problem, reduction = problem, None
+    if merge_radius:
+        from MILP.reduction import reduce_shade_problem, refine_selection, print_reduction
+        with recorder.stage("reduce", merge_radius=merge_radius) as record:
+            reduction = reduce_shade_problem(problem, merge_radius, min_candidates=max_shades, max_shades=max_shades)
+            record.update(reduction.stats)
+        print_reduction(reduction)
+        if reduction.problem.n < max_shades:
+            print(f"Only {reduction.problem.n} candidates left for {max_shades} shades, solving the full problem")
+            reduction = None
+        else:
+            model_problem = reduction.problem
+            if on_incumbent is not None:
+                # report incumbents in the original candidate numbering
+                report_incumbent = on_incumbent
+                on_incumbent = lambda event: report_incumbent({**event, "selected_idx": reduction.expand(event["selected_idx"])})
+
+    if backend == "highs":
+        _check_highs_formulation(formulation)
+        with recorder.stage("build_model", backend=backend, formulation=formulation, aggregate_conflicts=aggregate_conflicts) as record:
+            matrices = build_shade_matrices(model_problem, max_shades, aggregate_conflicts=aggregate_conflicts)
+            record.update(variables=matrices.variables, pair_variables=matrices.variables - model_problem.n, constraints=matrices.constraints)
+        print(f"Model: {matrices.variables} variables ({matrices.variables - model_problem.n} pair variables), {matrices.constraints} constraints")
+        if warm_start:
+            print("The highs backend has no warm start, solving from scratch")
+        sys.stdout.flush()
+
+        with recorder.stage("solve", solver="HiGHS", time_limit=time_limit, gap_rel=gap_rel) as record:
+            selected_idx, stats = solve_highs(matrices, msg=True, time_limit=time_limit, gap_rel=gap_rel)
+            record.update(stats)
+        if on_incumbent is not None:
+            on_incumbent({**{k: stats[k] for k in ("objective", "bound", "gap")}, "selected_idx": selected_idx, "elapsed": stats["solver_seconds"], "source": "highs"})
+    elif backend == "cbc":
+        # --- CONSTRUCT MODEL ---
+        with recorder.stage("build_model", backend=backend, formulation=formulation, aggregate_conflicts=aggregate_conflicts) as record:
+            model, x, y = build_shade_model(model_problem, max_shades, formulation=formulation, aggregate_conflicts=aggregate_conflicts)
+            record.update(variables=len(x) + len(y), pair_variables=len(y), constraints=len(model.constraints))
+        print(f"Model: {len(x) + len(y)} variables ({len(y)} pair variables), {len(model.constraints)} constraints")
+        sys.stdout.flush()
 
-        objective += 0.02 * socio_term
-    model += objective
+        # --- WARM START ---
+        incumbent = None
+        if warm_start:
+            from MILP.heuristic import heuristic_shade_problem
+            with recorder.stage("warm_start") as record:
+                incumbent = heuristic_shade_problem(model_problem, max_shades)
+                record["objective"] = model_problem.objective(incumbent)
+            print(f"Warm start objective (heuristic): {model_problem.objective(incumbent):.6f}")
+            sys.stdout.flush()
 
-    # --- SOLVE ---
-    model.solve(PULP_CBC_CMD(msg=True))
+        # --- SOLVE ---
+        from MILP.anytime import solve_cbc_anytime
+        with recorder.stage("solve", solver="CBC", time_limit=time_limit, gap_rel=gap_rel, threads=threads) as record:
+            selected_idx, stats = solve_cbc_anytime(
+                model_problem, model, x, y,
+                time_limit=time_limit, gap_rel=gap_rel, threads=threads,
+                on_incumbent=on_incumbent, incumbent=incumbent, msg=True,
+            )
+            record.update(stats)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
 
-    # Selected shades
-    selected_idx = [i for i in range(n) if x[i].value() == 1]
+    # --- REFINE ---
+    if reduction is not None:
+        with recorder.stage("refine") as record:
+            record["objective_reduced"] = model_problem.objective(selected_idx)
+            selected_idx = refine_selection(problem, reduction, selected_idx)
+            record["objective"] = problem.objective(selected_idx)
+        print(f"Refined objective: {record['objective']:.6f} (representatives: {record['objective_reduced']:.6f})")
 
     # Calculate success metrics
-    # Count of shade pairs >= spacing_threshold
-    count_close_pairs = 0
-    for i, j in itertools.combinations(selected_idx, 2):
-        if dist_matrix[i, j] < spacing_threshold:
-            count_close_pairs += 1
-
-    # Count of public facilities within threshold
-    covered_facilities = 0
-    for i in selected_idx:
-        covered_facilities += np.sum(public_dists[i] < public_service_threshold)
-
-    print(f"Shade pairs closer than threshold: {count_close_pairs}")
-    print(f"Public facilities covered by selected shades: {covered_facilities}")
+    with recorder.stage("metrics") as record:
+        metrics = solution_metrics(problem, selected_idx)
+        record.update(selected=len(selected_idx), **metrics)
+    print(f"Shade pairs closer than threshold: {metrics['count_close_pairs']}")
+    print(f"Public facilities covered by selected shades: {metrics['covered_facilities']} ({metrics['unique_facilities_covered']} unique)")
 
     return candidate_points.iloc[selected_idx]
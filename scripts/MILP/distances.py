@@ -0,0 +1,121 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional, fall back to a uniform grid index
+    cKDTree = None
+
+
+def point_coords(gdf):
+    """
+    Pull an (n, 2) float64 array of x/y coordinates out of a GeoDataFrame once.
+    Non-point geometries are represented by their centroid.
+    """
+    geoms = gdf.geometry
+    if len(geoms) and not (geoms.geom_type == "Point").all():
+        geoms = geoms.centroid
+    return np.column_stack([geoms.x.to_numpy(dtype=np.float64), geoms.y.to_numpy(dtype=np.float64)])
+
+
+def iter_distance_chunks(a, b=None, chunk_size=2048, dtype=np.float32):
+    """
+    Yield (start, block) where block holds the euclidean distances from
+    a[start:start + chunk_size] to every row of b (or of a when b is None).
+    Only one chunk_size x len(b) block is alive at a time.
+    """
+    b = a if b is None else b
+    for start in range(0, len(a), chunk_size):
+        diff = a[start:start + chunk_size, None, :] - b[None, :, :]
+        yield start, np.sqrt(np.einsum("ijk,ijk->ij", diff, diff)).astype(dtype, copy=False)
+
+
+def distance_matrix(a, b=None, chunk_size=2048, dtype=np.float32, out=None):
+    """
+    Full distance matrix between the rows of a and b (a x a when b is None),
+    filled chunk by chunk. Pass a preallocated array (e.g. np.memmap) as `out`
+    to keep memory bounded for large inputs.
+    """
+    m = len(a) if b is None else len(b)
+    if out is None:
+        out = np.empty((len(a), m), dtype=dtype)
+    for start, block in iter_distance_chunks(a, b, chunk_size=chunk_size, dtype=dtype):
+        out[start:start + len(block)] = block
+    return out
+
+
+class _GridIndex:
+    """Uniform grid bucket index used when scipy is not available."""
+
+    def __init__(self, coords, cell_size):
+        self.coords = coords
+        self.cell_size = cell_size
+        self.cells = {}
+        keys = np.floor(coords / cell_size).astype(np.int64)
+        for idx, key in enumerate(map(tuple, keys)):
+            self.cells.setdefault(key, []).append(idx)
+
+    def query_ball_point(self, points, r):
+        result = []
+        keys = np.floor(points / self.cell_size).astype(np.int64)
+        reach = int(np.ceil(r / self.cell_size))
+        for point, (cx, cy) in zip(points, keys):
+            found = []
+            for dx in range(-reach, reach + 1):
+                for dy in range(-reach, reach + 1):
+                    found.extend(self.cells.get((cx + dx, cy + dy), ()))
+            if found:
+                found = np.asarray(found)
+                d = np.hypot(*(self.coords[found] - point).T)
+                found = found[d <= r]
+            result.append(list(found))
+        return result
+
+
+def _build_index(coords, radius):
+    if cKDTree is not None:
+        return cKDTree(coords)
+    return _GridIndex(coords, max(float(radius), 1.0))
+
+
+def radius_pairs(coords, radius, dtype=np.float32):
+    """
+    All candidate pairs (i < j) closer than `radius` (e.g. spacing_threshold).
+    Returns (i, j, dist) arrays sorted by i then j.
+    """
+    if len(coords) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=dtype)
+
+    if cKDTree is not None:
+        pairs = cKDTree(coords).query_pairs(radius, output_type="ndarray")
+    else:
+        index = _GridIndex(coords, max(float(radius), 1.0))
+        pairs = [(i, j) for i, near in enumerate(index.query_ball_point(coords, radius)) for j in near if j > i]
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    i, j = pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.int64)
+    dist = np.hypot(*(coords[i] - coords[j]).T)
+    # query_pairs is inclusive, the optimizer only counts pairs strictly inside;
+    # compared in float64, so a pair right at the radius is not flipped by the cast
+    keep = dist < radius
+    return i[keep], j[keep], dist[keep].astype(dtype)
+
+
+def radius_neighbors(a, b, radius, dtype=np.float32):
+    """
+    All (row of a, row of b) pairs closer than `radius`, e.g. candidate ->
+    public facility pairs within public_service_threshold.
+    Returns (rows, cols, dist) arrays sorted by row then col.
+    """
+    if len(a) == 0 or len(b) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=dtype)
+
+    near = _build_index(b, radius).query_ball_point(a, radius)
+    counts = np.fromiter((len(cols) for cols in near), dtype=np.int64, count=len(a))
+    rows = np.repeat(np.arange(len(a), dtype=np.int64), counts)
+    cols = np.fromiter((c for cols in near for c in sorted(cols)), dtype=np.int64, count=int(counts.sum()))
+    dist = np.hypot(*(a[rows] - b[cols]).T)
+    keep = dist < radius
+    return rows[keep], cols[keep], dist[keep].astype(dtype)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+from MILP.data_store import load_dataset, WORKING_CRS
+
+# layer name -> attributes attached to candidates by default
+LAYER_ATTRIBUTES = {
+    "heat_layer": ["heat_layer"],
+    "socioeconomic_layer": ["socioeconomic_layer"],
+    "below_poverty": ["below_fpl_pct", "below_200fpl_pct"],
+    "social_sensitivity": ["SoVI_Score", "Poverty", "Outdoor_Workers", "Households_Without_Vehicle_Acce"],
+}
+
+
+class PolygonLayerIndex:
+    """
+    Prepared STRtree over one polygon layer plus its attribute columns.
+    Built once and reused for every candidate set that gets annotated.
+    """
+
+    def __init__(self, polygons, columns):
+        self.geometries = np.asarray(polygons.geometry.values, dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+        self.attributes = {column: polygons[column].to_numpy() for column in columns}
+
+    def lookup(self, points, columns=None):
+        """
+        Attributes of the polygon containing each point (first match when
+        polygons overlap, NaN outside every polygon), as {column: array}.
+        """
+        columns = columns or list(self.attributes)
+        point_idx, polygon_idx = self.tree.query(points, predicate="intersects")
+
+        # keep the first polygon per point, like a left join without duplicated rows
+        first = np.unique(point_idx, return_index=True)[1]
+        point_idx, polygon_idx = point_idx[first], polygon_idx[first]
+
+        result = {}
+        for column in columns:
+            values = self.attributes[column]
+            out = np.full(len(points), np.nan, dtype=np.float64 if values.dtype.kind in "iufb" else object)
+            out[point_idx] = values[polygon_idx]
+            result[column] = out
+        return result
+
+
+# in-process index cache: (layer, columns) -> PolygonLayerIndex
+_LAYER_INDEXES = {}
+
+
+def get_layer_index(layer, columns=None):
+    """Load a polygon layer from the data store and build its index once per process."""
+    columns = tuple(columns or LAYER_ATTRIBUTES[layer])
+    key = (layer, columns)
+    if key not in _LAYER_INDEXES:
+        _LAYER_INDEXES[key] = PolygonLayerIndex(load_dataset(layer, columns=list(columns)), columns)
+    return _LAYER_INDEXES[key]
+
+
+def enrich_candidates(candidates, layers=None, region=None):
+    """
+    Annotate candidates with polygon-layer attributes in one vectorized pass per layer.
+    layers maps layer name -> attribute list (default: heat and socioeconomic layers).
+    With a region (e.g. "dtla") the layers clipped and simplified for it are used
+    (preprocess_datasets/layers.py), the candidates must lie inside that region.
+    Returns a copy of candidates with the attribute columns added.
+    """
+    layers = layers or {"heat_layer": LAYER_ATTRIBUTES["heat_layer"], "socioeconomic_layer": LAYER_ATTRIBUTES["socioeconomic_layer"]}
+    if candidates.crs is not None and candidates.crs.to_epsg() != WORKING_CRS:
+        candidates = candidates.to_crs(WORKING_CRS)
+
+    points = np.asarray(candidates.geometry.values, dtype=object)
+    annotated = {}
+    for layer, columns in layers.items():
+        annotated.update(get_layer_index(f"{layer}_{region}" if region else layer, columns).lookup(points))
+
+    enriched = candidates.copy()
+    for column, values in annotated.items():
+        enriched[column] = pd.Series(values, index=candidates.index)
+    return enriched
@@ -0,0 +1,153 @@
+import heapq
+import itertools
+import numpy as np
+import sys
+import time
+
+from MILP.distance_optimizer import prepare_shade_problem
+
+
+def lazy_greedy(problem, max_shades, fixed_in=(), fixed_out=()):
+    """
+    Greedy selection with lazily re-evaluated marginal gains kept in a priority queue.
+    All spacing weights are <= 0, so a candidate's marginal gain can only drop as
+    shades are added, and a popped gain that is still up to date is the best one.
+    """
+    indptr, indices, weights = problem.neighbor_lists()
+    inter = np.zeros(problem.n)
+    selected = []
+    blocked = np.zeros(problem.n, dtype=bool)
+    blocked[list(fixed_out)] = True
+
+    def add(i):
+        selected.append(i)
+        blocked[i] = True
+        row = slice(indptr[i], indptr[i + 1])
+        np.add.at(inter, indices[row], weights[row])
+
+    for i in fixed_in:
+        add(int(i))
+
+    heap = [(-problem.linear[i] - inter[i], i) for i in range(problem.n) if not blocked[i]]
+    heapq.heapify(heap)
+    while len(selected) < max_shades and heap:
+        neg_gain, i = heapq.heappop(heap)
+        if blocked[i]:
+            continue
+        gain = problem.linear[i] + inter[i]
+        if heap and gain < -heap[0][0] - 1e-12:
+            heapq.heappush(heap, (-gain, i))   # stale, re-queue with the fresh gain
+            continue
+        add(i)
+
+    return selected
+
+
+def swap_local_search(problem, selected_idx, max_iterations=1000, two_swap=True, pool_size=30, fixed_in=(), fixed_out=()):
+    """
+    Improve a selection with best-improvement 1-swaps (one shade out, one in)
+    and, once no 1-swap helps, 2-swaps among the weakest selected shades and the
+    most promising unselected candidates.
+    """
+    n = problem.n
+    indptr, indices, weights = problem.neighbor_lists()
+    mask = np.zeros(n, dtype=bool)
+    mask[list(selected_idx)] = True
+    locked_in = np.zeros(n, dtype=bool)
+    locked_in[list(fixed_in)] = True
+    locked_out = np.zeros(n, dtype=bool)
+    locked_out[list(fixed_out)] = True
+    inter = problem.interaction(mask)
+
+    def weight_row(i):
+        row = np.zeros(n)
+        sl = slice(indptr[i], indptr[i + 1])
+        row[indices[sl]] = weights[sl]
+        return row
+
+    def move(out_idx, in_idx):
+        for i in out_idx:
+            mask[i] = False
+            sl = slice(indptr[i], indptr[i + 1])
+            np.add.at(inter, indices[sl], -weights[sl])
+        for i in in_idx:
+            mask[i] = True
+            sl = slice(indptr[i], indptr[i + 1])
+            np.add.at(inter, indices[sl], weights[sl])
+
+    for _ in range(max_iterations):
+        contribution = problem.linear + inter
+        closed = mask | locked_out
+        removable = np.flatnonzero(mask & ~locked_in)
+
+        # --- 1-swap ---
+        best_delta, best_move = 1e-9, None
+        for s in removable:
+            value = contribution - weight_row(s)
+            value[closed] = -np.inf
+            u = int(np.argmax(value))
+            delta = value[u] - contribution[s]
+            if delta > best_delta:
+                best_delta, best_move = delta, ([s], [u])
+        if best_move is not None:
+            move(*best_move)
+            continue
+
+        if not two_swap or len(removable) < 2:
+            break
+
+        # --- 2-swap ---
+        weakest = removable[np.argsort(contribution[removable])[:pool_size // 3 + 2]]
+        for s1, s2 in itertools.combinations(weakest, 2):
+            w_s = weight_row(s1)[s2]
+            value = contribution - weight_row(s1) - weight_row(s2)
+            value[closed] = -np.inf
+            pool = np.argsort(-value)[:pool_size]
+            pool = pool[np.isfinite(value[pool])]
+            if len(pool) < 2:
+                continue
+            pool_w = np.array([weight_row(u)[pool] for u in pool])
+            gain = value[pool][:, None] + value[pool][None, :] + pool_w
+            np.fill_diagonal(gain, -np.inf)
+            a, b = np.unravel_index(np.argmax(gain), gain.shape)
+            delta = gain[a, b] - (contribution[s1] + contribution[s2] - w_s)
+            if delta > best_delta:
+                best_delta, best_move = delta, ([s1, s2], [pool[a], pool[b]])
+        if best_move is None:
+            break
+        move(*best_move)
+
+    return np.flatnonzero(mask).tolist()
+
+
+def heuristic_shade_problem(problem, max_shades, local_search=True, two_swap=True, fixed_in=(), fixed_out=()):
+    """Lazy greedy + swap local search on a prepared ShadeProblem. Returns the selected candidate indices."""
+    selected = lazy_greedy(problem, max_shades, fixed_in=fixed_in, fixed_out=fixed_out)
+    if local_search:
+        selected = swap_local_search(problem, selected, two_swap=two_swap, fixed_in=fixed_in, fixed_out=fixed_out)
+    return sorted(selected)
+
+
+def optimize_shade_placement_heuristic(candidate_points, public_points, max_shades=15, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True, two_swap=True, cache=None):
+    """
+    Fast heuristic over the same objective as optimize_shade_placement
+    (no optimality proof). Returns (selected candidate_points, objective value).
+    """
+    problem = prepare_shade_problem(
+        candidate_points, public_points,
+        spacing_threshold=spacing_threshold,
+        public_service_threshold=public_service_threshold,
+        use_spacing=use_spacing,
+        use_public=use_public,
+        use_heat=use_heat,
+        use_socioeconomic=use_socioeconomic,
+        cache=cache,
+    )
+
+    start = time.perf_counter()
+    selected_idx = heuristic_shade_problem(problem, max_shades, two_swap=two_swap)
+    objective = problem.objective(selected_idx)
+    print(f"Heuristic objective: {objective:.6f} ({time.perf_counter() - start:.3f} s)")
+    sys.stdout.flush()
+
+    return candidate_points.iloc[selected_idx], objective
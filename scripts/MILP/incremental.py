@@ -0,0 +1,445 @@
+import sys
+import time
+
+import numpy as np
+from pulp import LpProblem, LpVariable, LpMinimize, LpBinary, LpAffineExpression
+
+from MILP.distance_optimizer import (
+    ShadeProblem, SPACING_WEIGHT, PUBLIC_WEIGHT, HEAT_WEIGHT, SOCIOECONOMIC_WEIGHT,
+    PUBLIC_SERVICE_DISTANCE_WEIGHTING, _normalize, set_warm_start,
+)
+from MILP.distances import point_coords, radius_pairs, radius_neighbors
+from MILP.instrumentation import solve_cbc
+
+
+class _PointGrid:
+    """Uniform grid of point ids that supports inserts and deletes, for radius queries around a few points."""
+
+    def __init__(self, cell_size):
+        self.cell_size = max(float(cell_size), 1.0)
+        self.cells = {}
+
+    def _key(self, xy):
+        return (int(np.floor(xy[0] / self.cell_size)), int(np.floor(xy[1] / self.cell_size)))
+
+    def add(self, idx, xy):
+        self.cells.setdefault(self._key(xy), set()).add(idx)
+
+    def remove(self, idx, xy):
+        cell = self.cells.get(self._key(xy))
+        if cell is not None:
+            cell.discard(idx)
+
+    def query(self, xy, r, coords):
+        """Ids of the points strictly within r of xy, and their distances (coords indexed by id)."""
+        cx, cy = self._key(xy)
+        reach = int(np.ceil(r / self.cell_size))
+        found = [idx for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+                 for idx in self.cells.get((cx + dx, cy + dy), ())]
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        found = np.asarray(found, dtype=np.int64)
+        dist = np.hypot(*(coords[found] - xy).T)
+        return found[dist < r], dist[dist < r]
+
+
+def _grow(array, size):
+    """array with room for at least `size` rows, doubling the capacity so appends stay amortized O(1)."""
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class IncrementalShadeModel:
+    """
+    The shade placement MILP (sparse formulation) kept in memory between what-if edits.
+
+    Candidates and public facilities get stable ids (their insertion order) that stay
+    valid across edits. Every edit only touches what it changes:
+    - add_candidates: spacing pairs and coverage of the new stops (grid index lookups),
+      their x / y variables and pair constraints
+    - remove_candidates: the stops are fixed to 0 and dropped from the objective
+    - add_facilities / remove_facilities: coverage of the stops around those facilities
+      and their objective coefficients
+    - fix_in / fix_out / release: variable bounds only (fixed-in stops count toward max_shades)
+    The scores are min-max normalized over the active candidates like prepare_shade_problem,
+    so an edit that moves a minimum or maximum rescales every reward; that pass is a
+    vectorized O(n), and only coefficients that actually change are written to the model.
+    Removed stops stay in the PuLP model as fixed variables until they make up
+    compact_ratio of it, then the model is rebuilt once.
+    solve() re-solves with CBC, warm-started from the previous selection repaired for
+    the edits; it reads the maintained rewards and adjacency instead of rebuilding a
+    ShadeProblem. PuLP still hands CBC the whole model as a file on every solve.
+    """
+
+    def __init__(self, candidate_coords, public_coords, heat_values=None, socioeconomic_values=None, max_shades=15, spacing_threshold=300, public_service_threshold=300, use_spacing=True, use_public=True, compact_ratio=0.25):
+        self.max_shades = max_shades
+        self.spacing_threshold = spacing_threshold
+        self.public_service_threshold = public_service_threshold
+        self.use_spacing = use_spacing
+        self.use_public = use_public
+        self.use_heat = heat_values is not None
+        self.use_socioeconomic = socioeconomic_values is not None
+        self.compact_ratio = compact_ratio
+
+        candidate_coords = np.asarray(candidate_coords, dtype=np.float64).reshape(-1, 2)
+        public_coords = np.asarray(public_coords, dtype=np.float64).reshape(-1, 2)
+        n, p = len(candidate_coords), len(public_coords)
+
+        # --- CANDIDATES ---
+        self.size = n
+        self._xy = candidate_coords.copy()
+        self._heat = np.array(heat_values, dtype=np.float64) if self.use_heat else np.zeros(n)
+        self._socio = np.array(socioeconomic_values, dtype=np.float64) if self.use_socioeconomic else np.zeros(n)
+        self._active = np.ones(n, dtype=bool)
+        self._public_raw = np.zeros(n)
+        self._linear = np.zeros(n)
+        self.fixed_in, self.fixed_out = set(), set()
+        self.candidate_grid = _PointGrid(spacing_threshold)
+        for i in range(n):
+            self.candidate_grid.add(i, self._xy[i])
+
+        # --- FACILITIES ---
+        self.facility_size = p
+        self._facility_xy = public_coords.copy()
+        self._facility_active = np.ones(p, dtype=bool)
+        self.facility_grid = _PointGrid(public_service_threshold)
+        for f in range(p):
+            self.facility_grid.add(f, self._facility_xy[f])
+
+        # close pairs and coverage as adjacency dicts: neighbors[i][j] = distance
+        self.neighbors = {i: {} for i in range(n)}
+        if use_spacing:
+            for i, j, d in zip(*(a.tolist() for a in radius_pairs(candidate_coords, spacing_threshold, dtype=np.float64))):
+                self.neighbors[i][j] = self.neighbors[j][i] = d
+        self.covers = {i: {} for i in range(n)}          # candidate -> {facility: distance}
+        self.covered_by = {f: {} for f in range(p)}      # facility -> {candidate: distance}
+        rows, cols, dist = radius_neighbors(candidate_coords, public_coords, public_service_threshold, dtype=np.float64)
+        for i, f, d in zip(rows.tolist(), cols.tolist(), dist.tolist()):
+            self.covers[i][f] = self.covered_by[f][i] = d
+        np.add.at(self._public_raw, rows, self._coverage_weight(dist))
+
+        self.selected = []
+        self.last_solve = {}
+        self._build_model()
+
+    @classmethod
+    def from_points(cls, candidate_points, public_points, use_heat=True, use_socioeconomic=True, **kwargs):
+        """Model over the GeoDataFrames optimize_shade_placement takes (EPSG:3857); candidate ids are row positions."""
+        return cls(
+            point_coords(candidate_points), point_coords(public_points),
+            heat_values=candidate_points.heat_layer.to_numpy() if use_heat else None,
+            socioeconomic_values=candidate_points.socioeconomic_layer.to_numpy() if use_socioeconomic else None,
+            **kwargs,
+        )
+
+    # --- scores ---
+
+    def _pair_weight(self, d):
+        return SPACING_WEIGHT * (-1 + d / self.spacing_threshold)
+
+    def _coverage_weight(self, d):
+        return 1 - np.asarray(d, dtype=np.float64) / self.public_service_threshold * PUBLIC_SERVICE_DISTANCE_WEIGHTING
+
+    def _scores(self):
+        """Normalized (public, heat, socioeconomic) scores of every id, 0 for removed candidates."""
+        active = self._active[:self.size]
+        scores = []
+        for values, used, label in ((self._public_raw, self.use_public, "Public"), (self._heat, self.use_heat, "Heat"), (self._socio, self.use_socioeconomic, "Socioeconomic")):
+            score = np.zeros(self.size)
+            if used and active.any():
+                score[active] = _normalize(values[:self.size][active], label)
+            scores.append(score)
+        return scores
+
+    def _refresh_linear(self):
+        """Recompute the rewards and write the ones that changed into the objective."""
+        public_score, heat_score, socio_score = self._scores()
+        linear = PUBLIC_WEIGHT * public_score + HEAT_WEIGHT * heat_score + SOCIOECONOMIC_WEIGHT * socio_score
+        changed = np.flatnonzero(linear != self._linear[:self.size])
+        for i in changed.tolist():
+            if self._active[i]:
+                self.model.objective[self.x[i]] = -linear[i]
+        self._linear = _grow(self._linear, self.size)
+        self._linear[:self.size] = linear
+        return len(changed)
+
+    # --- model ---
+
+    def _add_pair(self, i, j, d):
+        i, j = min(i, j), max(i, j)
+        y = LpVariable(f"y_{i}_{j}", lowBound=0, upBound=1)
+        self.y[(i, j)] = y
+        self.model += y >= self.x[i] + self.x[j] - 1, f"pair_{i}_{j}"
+        self.model.objective[y] = -self._pair_weight(d)
+
+    def _add_variable(self, i):
+        self.x[i] = LpVariable(f"x_{i}", cat=LpBinary)
+        self.cardinality.expr[self.x[i]] = 1
+
+    def _build_model(self):
+        """(Re)build the PuLP model from the active candidates, as build_shade_model(formulation="sparse") would."""
+        # minimizing the negated objective, see build_shade_model
+        self.model = LpProblem("Shade_Placement", LpMinimize)
+        self.model += LpAffineExpression()
+        self.model += LpAffineExpression() == self.max_shades, "max_shades"
+        self.cardinality = self.model.constraints["max_shades"]
+        self.x, self.y = {}, {}
+        for i in np.flatnonzero(self._active[:self.size]).tolist():
+            self._add_variable(i)
+            self._apply_bounds(i)
+            if self._linear[i]:
+                self.model.objective[self.x[i]] = -self._linear[i]
+        for i, near in self.neighbors.items():
+            for j, d in near.items():
+                if i < j:
+                    self._add_pair(i, j, d)
+        self.tombstones = 0
+        self._refresh_linear()
+
+    def _apply_bounds(self, i):
+        x = self.x[i]
+        x.lowBound = 1 if i in self.fixed_in else 0
+        x.upBound = 0 if i in self.fixed_out or not self._active[i] else 1
+
+    def _check_ids(self, ids, size, active, kind):
+        ids = [int(i) for i in ids]
+        for i in ids:
+            if not 0 <= i < size or not active[i]:
+                raise KeyError(f"No active {kind} with id {i}")
+        return ids
+
+    # --- edits ---
+
+    def add_candidates(self, coords, heat_values=None, socioeconomic_values=None):
+        """Add stops at the (k, 2) coordinates (EPSG:3857) with their raw layer values. Returns their ids."""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        k = len(coords)
+        ids = list(range(self.size, self.size + k))
+        self._xy, self._heat, self._socio = _grow(self._xy, self.size + k), _grow(self._heat, self.size + k), _grow(self._socio, self.size + k)
+        self._active, self._public_raw, self._linear = _grow(self._active, self.size + k), _grow(self._public_raw, self.size + k), _grow(self._linear, self.size + k)
+        self._xy[ids] = coords
+        # a missing value scores 0, like a stop outside every polygon of a layer
+        self._heat[ids] = np.nan if heat_values is None else heat_values
+        self._socio[ids] = np.nan if socioeconomic_values is None else socioeconomic_values
+        self._public_raw[ids] = 0
+        self._linear[ids] = 0
+        self.size += k
+
+        for i in ids:
+            self._active[i] = True
+            self._add_variable(i)
+            self._apply_bounds(i)
+            self.neighbors[i], self.covers[i] = {}, {}
+            if self.use_spacing:
+                near, dist = self.candidate_grid.query(self._xy[i], self.spacing_threshold, self._xy)
+                for j, d in zip(near.tolist(), dist.tolist()):
+                    self.neighbors[i][j] = self.neighbors[j][i] = d
+                    self._add_pair(i, j, d)
+            self.candidate_grid.add(i, self._xy[i])
+            near, dist = self.facility_grid.query(self._xy[i], self.public_service_threshold, self._facility_xy)
+            for f, d in zip(near.tolist(), dist.tolist()):
+                self.covers[i][f] = self.covered_by[f][i] = d
+            self._public_raw[i] = self._coverage_weight(dist).sum()
+        self._refresh_linear()
+        return ids
+
+    def remove_candidates(self, ids):
+        """Remove stops; they can not be selected anymore and their pairs and coverage no longer count."""
+        for i in self._check_ids(ids, self.size, self._active, "candidate"):
+            self._active[i] = False
+            self.fixed_in.discard(i)
+            self.fixed_out.discard(i)
+            self.candidate_grid.remove(i, self._xy[i])
+            for j in self.neighbors.pop(i):
+                del self.neighbors[j][i]
+            for f in self.covers.pop(i):
+                del self.covered_by[f][i]
+            self._apply_bounds(i)
+            self.model.objective.pop(self.x[i], None)
+            self.tombstones += 1
+        self.selected = [i for i in self.selected if self._active[i]]
+        self._refresh_linear()
+        if self.tombstones > self.compact_ratio * len(self.x):
+            self._compact()
+
+    def add_facilities(self, coords):
+        """Add public facilities at the (k, 2) coordinates (EPSG:3857). Returns their ids."""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        ids = list(range(self.facility_size, self.facility_size + len(coords)))
+        self._facility_xy = _grow(self._facility_xy, self.facility_size + len(coords))
+        self._facility_active = _grow(self._facility_active, self.facility_size + len(coords))
+        self._facility_xy[ids] = coords
+        self._facility_active[ids] = True
+        self.facility_size += len(coords)
+        for f in ids:
+            self.facility_grid.add(f, self._facility_xy[f])
+            near, dist = self.candidate_grid.query(self._facility_xy[f], self.public_service_threshold, self._xy)
+            self.covered_by[f] = {}
+            for i, d in zip(near.tolist(), dist.tolist()):
+                self.covers[i][f] = self.covered_by[f][i] = d
+            np.add.at(self._public_raw, near, self._coverage_weight(dist))
+        self._refresh_linear()
+        return ids
+
+    def remove_facilities(self, ids):
+        """Remove public facilities, taking their coverage off the stops around them."""
+        for f in self._check_ids(ids, self.facility_size, self._facility_active, "facility"):
+            self._facility_active[f] = False
+            self.facility_grid.remove(f, self._facility_xy[f])
+            for i, d in self.covered_by.pop(f).items():
+                del self.covers[i][f]
+                self._public_raw[i] -= self._coverage_weight(d)
+        self._refresh_linear()
+
+    def fix_in(self, ids):
+        """Force stops into every selection (e.g. they already have shade); they count toward max_shades."""
+        ids = self._check_ids(ids, self.size, self._active, "candidate")
+        if len(self.fixed_in | set(ids)) > self.max_shades:
+            raise ValueError(f"Can not fix more than max_shades={self.max_shades} stops in")
+        for i in ids:
+            self.fixed_in.add(i)
+            self.fixed_out.discard(i)
+            self._apply_bounds(i)
+
+    def fix_out(self, ids):
+        """Keep stops out of every selection without removing their data."""
+        for i in self._check_ids(ids, self.size, self._active, "candidate"):
+            self.fixed_out.add(i)
+            self.fixed_in.discard(i)
+            self._apply_bounds(i)
+
+    def release(self, ids):
+        """Undo fix_in / fix_out."""
+        for i in self._check_ids(ids, self.size, self._active, "candidate"):
+            self.fixed_in.discard(i)
+            self.fixed_out.discard(i)
+            self._apply_bounds(i)
+
+    def set_max_shades(self, max_shades):
+        if max_shades < len(self.fixed_in):
+            raise ValueError(f"max_shades={max_shades} is below the {len(self.fixed_in)} stops fixed in")
+        self.max_shades = max_shades
+        self.cardinality.constant = -max_shades
+
+    def _compact(self):
+        start = time.perf_counter()
+        removed = self.tombstones
+        self._build_model()
+        print(f"Rebuilt the model without {removed} removed stops in {time.perf_counter() - start:.2f} s")
+        sys.stdout.flush()
+
+    # --- solve ---
+
+    def problem(self):
+        """
+        ShadeProblem over the active candidates (for the heuristic, metrics or the other solvers).
+        Returns (problem, ids) where problem index k is candidate id ids[k].
+        """
+        ids = np.flatnonzero(self._active[:self.size])
+        local = np.full(self.size, -1, dtype=np.int64)
+        local[ids] = np.arange(len(ids))
+        facility_ids = np.flatnonzero(self._facility_active[:self.facility_size])
+        facility_local = np.full(self.facility_size, -1, dtype=np.int64)
+        facility_local[facility_ids] = np.arange(len(facility_ids))
+
+        pairs = [(i, j, d) for i in ids.tolist() for j, d in self.neighbors[i].items() if i < j]
+        pair_i = np.array([i for i, _, _ in pairs], dtype=np.int64)
+        pair_j = np.array([j for _, j, _ in pairs], dtype=np.int64)
+        pair_dist = np.array([d for _, _, d in pairs], dtype=np.float64)
+        coverage = [sorted(self.covers[i].items()) for i in ids.tolist()]
+        coverage_indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in coverage], out=coverage_indptr[1:])
+        public_score, heat_score, socio_score = (score[ids] for score in self._scores())
+        problem = ShadeProblem(
+            candidate_coords=self._xy[ids],
+            public_coords=self._facility_xy[facility_ids],
+            coverage_indptr=coverage_indptr,
+            coverage_indices=facility_local[np.array([f for c in coverage for f, _ in c], dtype=np.int64)],
+            coverage_dist=np.array([d for c in coverage for _, d in c], dtype=np.float64),
+            pair_i=local[pair_i],
+            pair_j=local[pair_j],
+            pair_dist=pair_dist,
+            pair_weight=self._pair_weight(pair_dist),
+            public_score=public_score,
+            heat_score=heat_score,
+            socio_score=socio_score,
+            linear=self._linear[ids],
+            spacing_threshold=self.spacing_threshold,
+            public_service_threshold=self.public_service_threshold,
+        )
+        return problem, ids
+
+    def _objective(self, selected):
+        """Objective value of a selection of ids, from the maintained rewards and close pairs."""
+        chosen = set(selected)
+        spacing = sum(self._pair_weight(d) for i in chosen for j, d in self.neighbors[i].items() if i < j and j in chosen)
+        return float(self._linear[list(chosen)].sum() + spacing)
+
+    def _warm_start(self):
+        """
+        The previous selection repaired for the edits since: the fixed-in stops first, then the
+        previous picks that are still allowed, the free slots filled greedily by gain given
+        the picks so far. Returns candidate ids.
+        """
+        keep = sorted(self.fixed_in) + [i for i in self.selected if i not in self.fixed_in and i not in self.fixed_out and self._active[i]]
+        keep = keep[:self.max_shades]
+        gain = self._linear[:self.size].copy()
+        allowed = self._active[:self.size].copy()
+        allowed[list(self.fixed_out)] = False
+
+        def pick(i):
+            allowed[i] = False
+            for j, d in self.neighbors[i].items():
+                gain[j] += self._pair_weight(d)
+
+        for i in keep:
+            pick(i)
+        while len(keep) < self.max_shades:
+            i = int(np.argmax(np.where(allowed, gain, -np.inf)))
+            keep.append(i)
+            pick(i)
+        return keep
+
+    def solve(self, time_limit=None, gap_rel=None, threads=None, msg=False):
+        """
+        Re-solve with CBC, warm-started from the previous selection: fixed-in stops and the
+        previous picks that are still allowed are kept and the rest is filled greedily.
+        Returns the selected candidate ids.
+        """
+        start = time.perf_counter()
+        available = int(self._active[:self.size].sum()) - len(self.fixed_out)
+        if available < self.max_shades:
+            raise ValueError(f"Only {available} stops can be selected for max_shades={self.max_shades}")
+        incumbent = self._warm_start()
+        set_warm_start(self.x, self.y, incumbent)
+
+        stats = solve_cbc(self.model, msg=msg, threads=threads, warmStart=True, timeLimit=time_limit, gapRel=gap_rel)
+        # PuLP reports "Optimal" for any stop with a solution (including the time limit)
+        if stats["status"] != "Optimal":
+            raise RuntimeError(f"CBC found no feasible selection ({stats['status']}: {stats['result']})")
+        self.selected = [i for i in np.flatnonzero(self._active[:self.size]).tolist() if self.x[i].value() is not None and self.x[i].value() > 0.5]
+        self.last_solve = {
+            **stats,
+            "warm_start_objective": self._objective(incumbent),
+            "objective": self._objective(self.selected),
+            "seconds": time.perf_counter() - start,
+        }
+        return list(self.selected)
+
+    def metrics(self):
+        """solution_metrics of the current selection, from the grid and coverage index."""
+        chosen = set(self.selected)
+        close_pairs = sum(
+            1 for i in self.selected
+            for j in self.candidate_grid.query(self._xy[i], self.spacing_threshold, self._xy)[0].tolist()
+            if i < j and j in chosen
+        )
+        covered = [f for i in self.selected for f in self.covers[i]]
+        return {
+            "count_close_pairs": close_pairs,
+            "covered_facilities": len(covered),
+            "unique_facilities_covered": len(set(covered)),
+        }
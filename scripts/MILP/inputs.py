@@ -0,0 +1,50 @@
+import os
+
+import geopandas as gpd
+import pandas as pd
+
+from MILP.data_store import load_dataset, REPO_ROOT
+from MILP.enrichment import enrich_candidates
+from MILP.raster_sampling import sample_raster
+
+HEAT_RASTER_PATH = os.path.join(REPO_ROOT, "461/data/ECOSTRESS_LST.tif")
+PUBLIC_FACILITY_DATASETS = ("schools", "hospitals", "food")
+
+
+def load_candidates_and_facilities(limit_scope_dtla=True, use_only_major_transit_stops=False):
+    """
+    Candidate shade locations (bus or major transit stops) and the combined public
+    facilities, from the GeoParquet store in EPSG:3857. Only the used scope is loaded.
+    """
+    scope = "_dtla" if limit_scope_dtla else ""
+
+    # Get all the possible shade locations
+    candidates = load_dataset(("major_transit_stops" if use_only_major_transit_stops else "bus_stops") + scope)
+
+    # --- Combine all public service facilities ---
+    public_points = gpd.GeoDataFrame(pd.concat(
+        [load_dataset(name + scope, columns=[]) for name in PUBLIC_FACILITY_DATASETS],
+        ignore_index=True), crs=3857)
+    return candidates, public_points
+
+
+def enrich_shade_candidates(candidates, heat_raster_path=HEAT_RASTER_PATH, heat_raster_buffer=30, region=None):
+    """
+    Attach the heat_layer, socioeconomic_layer and heat_socio_layer (their sum) columns.
+    Heat is sampled from the LST raster when heat_raster_path exists (mean within
+    heat_raster_buffer meters), otherwise taken from the vector heat layer.
+    region selects the polygon layers prepared for that study region (see enrich_candidates).
+    """
+    # one indexed point-in-polygon pass over all layers (add e.g. "below_poverty" or "social_sensitivity" for more attributes)
+    use_heat_raster = heat_raster_path is not None and os.path.exists(heat_raster_path)
+    layers = {"socioeconomic_layer": ["socioeconomic_layer"]}
+    if not use_heat_raster:
+        layers["heat_layer"] = ["heat_layer"]
+    enriched = enrich_candidates(candidates, layers, region=region)
+    if use_heat_raster:
+        # windowed batch sampling, only the raster tiles under the candidates are read
+        enriched["heat_layer"] = sample_raster(enriched, heat_raster_path, buffer=heat_raster_buffer)
+
+    # --- Add together heat and socioeconomic layers to visualize point priority by these 2 objectives
+    enriched['heat_socio_layer'] = enriched['heat_layer'] + enriched['socioeconomic_layer']
+    return enriched
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pulp import LpStatus, PULP_CBC_CMD
+
+try:
+    import resource
+except ImportError:  # not available on Windows, the RSS high-water mark is skipped there
+    resource = None
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+class RunRecorder:
+    """
+    Collects per-stage measurements of one run (wall time, peak memory, model size,
+    solver statistics) and writes them as one JSON report.
+
+        recorder = RunRecorder(hooks=[print_stage])
+        with recorder.stage("build_model") as record:
+            model, x, y = build_shade_model(problem, max_shades)
+            record["variables"] = len(x) + len(y)
+        recorder.write("optimized_shades.report.json")
+
+    Every hook is called as hook(stage_name, record) when a stage finishes.
+    With trace_memory=True the peak traced (Python / NumPy) memory of each stage is
+    recorded too, which slows allocation-heavy stages such as PuLP model building down,
+    so it is off by default; the peak RSS is always recorded.
+    Stages are not meant to be nested, a nested stage resets the enclosing stage's peak.
+    """
+
+    def __init__(self, trace_memory=False, hooks=()):
+        self.trace_memory = trace_memory
+        self.hooks = list(hooks)
+        self.info = {}
+        self.stages = []
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._start = time.perf_counter()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name, **info):
+        record = {"stage": name, **info}
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.trace_memory:
+                record["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                if started_tracing:
+                    tracemalloc.stop()
+            record["max_rss_mb"] = _max_rss_mb()
+            self.stages.append(record)
+            for hook in self.hooks:
+                hook(name, record)
+
+    def report(self):
+        return {
+            "started_at": self.started_at,
+            "total_seconds": time.perf_counter() - self._start,
+            **self.info,
+            "stages": self.stages,
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=_json_default)
+        print(f"Saved run report to {path}")
+
+
+def _json_default(value):
+    # numpy scalars and the like
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def print_stage(name, record):
+    """Hook that prints a one-line summary of every finished stage."""
+    memory = f", peak {record['peak_traced_mb']:.1f} MB" if record.get("peak_traced_mb") is not None else ""
+    print(f"⏱️ {name}: {record['seconds']:.2f} s{memory}")
+    sys.stdout.flush()
+
+
+_INCUMBENT = re.compile(r"Integer solution of (\S+) found .*\(([\d.]+) seconds\)")
+
+
+def parse_cbc_log(log):
+    """
+    Solver statistics from a CBC log: result line, objective and bound (in the
+    model's own sense), relative gap, nodes, iterations, wall time, number of
+    incumbents and the time the first one was found.
+    """
+    def field(pattern, cast=float):
+        match = re.search(pattern, log, re.MULTILINE)
+        return cast(match.group(1)) if match else None
+
+    incumbents = _INCUMBENT.findall(log)
+    # the partial-search summary has the full-precision bound, the closing summary a rounded one
+    bound = field(r"best possible (\S+?)\)")
+    stats = {
+        "result": field(r"^Result - (.+)$", str),
+        "objective": field(r"^Objective value:\s+(\S+)"),
+        "bound": bound if bound is not None else field(r"^(?:Upper|Lower) bound:\s+(\S+)"),
+        "nodes": field(r"^Enumerated nodes:\s+(\d+)", int),
+        "iterations": field(r"^Total iterations:\s+(\d+)", int),
+        "solver_seconds": field(r"^Time \(Wallclock seconds\):\s+(\S+)"),
+        "incumbents": len(incumbents),
+        "time_to_first_incumbent": float(incumbents[0][1]) if incumbents else None,
+    }
+    if stats["result"] and stats["result"].startswith("Optimal") and "gap" not in stats["result"]:
+        stats["gap"] = 0.0
+    elif stats["objective"] is not None and stats["bound"] is not None:
+        stats["gap"] = abs(stats["bound"] - stats["objective"]) / max(abs(stats["objective"]), 1e-9)
+    else:
+        stats["gap"] = None
+    return stats
+
+
+def solve_cbc(model, msg=False, **options):
+    """
+    Solve a PuLP model with CBC and return its statistics (parse_cbc_log plus the PuLP status).
+    The CBC log goes to a temporary file so it can be parsed; with msg=True it is
+    printed once the solve finishes.
+    """
+    fd, log_path = tempfile.mkstemp(suffix=".cbc.log")
+    os.close(fd)
+    try:
+        model.solve(PULP_CBC_CMD(msg=False, logPath=log_path, **options))
+        with open(log_path, "r") as f:
+            log = f.read()
+    finally:
+        os.remove(log_path)
+    if msg:
+        print(log)
+        sys.stdout.flush()
+    return {"status": LpStatus[model.status], **parse_cbc_log(log)}
@@ -1,10 +1,3 @@
-import pandas as pd
-import geopandas as gpd
-import numpy as np
-import contextily as cx
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use("Agg")  # use non-interactive backend
 from pulp import *
 import sys, os
 
@@ -13,58 +6,40 @@ sys.path.append(os.path.abspath("../"))  # one level up from your notebook
 
 # now import the function
 from MILP.distance_optimizer import optimize_shade_placement
+from MILP.decomposition import optimize_shade_placement_decomposed
+from MILP.sweep import sweep_max_shades
+from MILP.cache import ArrayCache
+from MILP.inputs import load_candidates_and_facilities, enrich_shade_candidates
+from MILP.instrumentation import RunRecorder, print_stage
+from MILP.anytime import incumbent_writer
 
 use_only_major_transit_stops = False
 limit_scope_dtla = True
+use_decomposition = not limit_scope_dtla   # tile the county and solve the tiles in parallel
+sweep_shade_counts = None                  # e.g. [30, 50, 100] to solve every count from one model build
+heat_raster_path = "../../461/data/ECOSTRESS_LST.tif"   # when present, heat is sampled from the LST raster instead of the vector heat layer
+heat_raster_buffer = 30                    # meters around each stop averaged from the raster (0 = pixel under the stop)
+trace_memory = False                       # also record each stage's peak traced memory (tracemalloc slows model building down)
 
+# per-stage time / memory / model size / solver statistics, saved as a JSON report next to the output GeoJSON
+recorder = RunRecorder(trace_memory=trace_memory, hooks=[print_stage])
 
-# --- Load DTLA data ---
-bus_stops = gpd.read_file("../../461/data/bus_stops.geojson").to_crs(3857)
-bus_stops_dtla = gpd.read_file("../../data/preprocessed/bus_stops_dtla.geojson").to_crs(3857)
-major_transit_stops = gpd.read_file("../../data/raw/la_major_transit_stops.geojson").to_crs(3857)
-major_transit_stops_dtla = gpd.read_file("../../data/preprocessed/la_major_transit_stops_dtla.geojson").to_crs(3857)
 
-schools_dtla = gpd.read_file("../../data/preprocessed/la_schools_dtla.geojson").to_crs(3857)
-hospitals_dtla = gpd.read_file("../../data/preprocessed/la_hospitals_clinics_dtla.geojson").to_crs(3857)
-food_dtla = gpd.read_file("../../data/preprocessed/la_food_assistance_dtla.geojson").to_crs(3857)
-schools = gpd.read_file("../../data/raw/la_schools_colleges_universities.geojson").to_crs(3857)
-hospitals = gpd.read_file("../../data/raw/la_hospitals_clinics_live.geojson").to_crs(3857)
-food = gpd.read_file("../../data/raw/la_food_assistance.geojson").to_crs(3857)
-
-ucla_shade_heat = gpd.read_file("../../data/layers/heat_layer.geojson").to_crs(3857)
-ucla_shade_socio = gpd.read_file("../../data/layers/socioeconomic_layer.geojson").to_crs(3857)
-
-if limit_scope_dtla: 
-    # Get all the possible shade locations for dtla
-    possible_shade_locations = major_transit_stops_dtla if use_only_major_transit_stops else bus_stops_dtla
-
-    # --- Combine all public service facilities ---
-    public_points = gpd.GeoDataFrame(pd.concat(
-    [schools_dtla[['geometry']], hospitals_dtla[['geometry']], food_dtla[['geometry']]],
-    ignore_index=True), crs=3857)
-
-else: 
-    # Get all the possible shade locations for la county
-    possible_shade_locations = major_transit_stops if use_only_major_transit_stops else bus_stops
-
-    # --- Combine all public service facilities ---
-    public_points = gpd.GeoDataFrame(pd.concat(
-    [schools[['geometry']], hospitals[['geometry']], food[['geometry']]],
-    ignore_index=True), crs=3857)
+# --- Load data ---
+# datasets come from the GeoParquet store (python data_store.py), already in EPSG:3857,
+# and only the scope that is used gets loaded
+with recorder.stage("load_data") as record:
+    possible_shade_locations, public_points = load_candidates_and_facilities(limit_scope_dtla, use_only_major_transit_stops)
+    record.update(candidates=len(possible_shade_locations), public_facilities=len(public_points))
 
 # --- Combine heat and shade layers with bus stops ---
-processed_shade_stops = gpd.sjoin(possible_shade_locations, ucla_shade_heat, how = 'left')
-processed_shade_stops = processed_shade_stops.drop(columns=['index_right'])
-processed_shade_stops = gpd.sjoin(processed_shade_stops, ucla_shade_socio, how = 'left')
+with recorder.stage("enrichment", heat_raster=os.path.exists(heat_raster_path)):
+    # DTLA runs use the polygon layers clipped and simplified for it (python ../preprocess_datasets/layers.py --region dtla)
+    processed_shade_stops = enrich_shade_candidates(possible_shade_locations, heat_raster_path, heat_raster_buffer, region="dtla" if limit_scope_dtla else None)
 print(processed_shade_stops.columns)
 
-# --- Add together heat and socioeconomic layers to visualize point priority by these 2 objectives
-processed_shade_stops['heat_socio_layer'] = (
-    processed_shade_stops['heat_layer'] + processed_shade_stops['socioeconomic_layer']
-)
-
 # --- Run the MILP optimizer ---
-optimized_shades = optimize_shade_placement(
+optimizer_params = dict(
     candidate_points=processed_shade_stops,
     public_points=public_points,
     max_shades=30,
@@ -74,42 +49,72 @@ optimized_shades = optimize_shade_placement(
     use_socioeconomic=True,
     spacing_threshold=500,
     public_service_threshold=300,
+    formulation="sparse",                     # only model candidate pairs inside the spacing radius; "dense": the original objective (data/README.md)
+    aggregate_conflicts=not limit_scope_dtla, # tighter per-candidate conflict constraints for county-scale runs
+    warm_start=True,                          # start CBC from the lazy greedy + swap heuristic solution
+    backend="cbc",                            # "highs": matrix-form model solved in-process by HiGHS (no warm start)
+    time_limit=None,                          # e.g. 600: wall-clock budget in seconds, the best selection found by then is used
+    gap_rel=None,                             # e.g. 0.005: stop once the solution is proven within 0.5% of optimal
+    threads=None,                             # e.g. os.cpu_count(): CBC threads
+    merge_radius=None,                        # e.g. 25: merge stops this close (same intersection) before the MILP, refine after
+    cache=ArrayCache(),                       # reuse distance / coverage arrays from data/cache when inputs are unchanged
 )
-
-print(f"Selected {len(optimized_shades)} optimal shade sites.")
-
 shade_type = "Major Transit" if use_only_major_transit_stops else "Buses"
 shade_area = "DTLA" if limit_scope_dtla else "LAC"
-num_shades = str(len(optimized_shades))
-optimized_shades.to_file(f"../../data/optimized_shades_{shade_type}_{shade_area}_{num_shades}.geojson", driver="GeoJSON")
-print(f"Saved {len(optimized_shades)} optimized shade locations to ../../data/optimized_shades.geojson")
-
-# --- Visualize ---
-fig, axes = plt.subplots(1, 2, figsize=(24, 8))
+recorder.info["parameters"] = {
+    "scope": shade_area,
+    "candidates": shade_type,
+    **{k: v for k, v in optimizer_params.items() if k not in ("candidate_points", "public_points", "cache")},
+}
+
+# only the monolithic solve takes these
+anytime_params = ("time_limit", "gap_rel", "threads", "merge_radius")
+
+if sweep_shade_counts:
+    # solves and saves every count in one pass, each solve bounded by time_limit / gap_rel
+    sweep_params = {k: v for k, v in optimizer_params.items() if k not in ("max_shades", "spacing_threshold", "public_service_threshold", "warm_start", "backend", "merge_radius")}
+    with recorder.stage("sweep", shade_counts=sweep_shade_counts):
+        sweep_results = sweep_max_shades(
+            shade_counts=sweep_shade_counts,
+            spacing_thresholds=(optimizer_params["spacing_threshold"],),
+            public_service_thresholds=(optimizer_params["public_service_threshold"],),
+            output_dir="../../data",
+            name_prefix=f"optimized_shades_{shade_type}_{shade_area}",
+            **sweep_params,
+        )
+    optimized_shades = sweep_results[(optimizer_params["spacing_threshold"], optimizer_params["public_service_threshold"], max(sweep_shade_counts))]
+elif use_decomposition:
+    with recorder.stage("decomposed_solve") as record:
+        optimized_shades, decomposition_report = optimize_shade_placement_decomposed(**{k: v for k, v in optimizer_params.items() if k not in anytime_params})
+        record.update(decomposition_report)
+else:
+    # every improving selection is written as it is found, so an interrupted run still leaves a layout
+    incumbent_path = f"../../data/optimized_shades_{shade_type}_{shade_area}_{optimizer_params['max_shades']}.incumbent.geojson"
+    optimized_shades = optimize_shade_placement(**optimizer_params, recorder=recorder, on_incumbent=incumbent_writer(incumbent_path, processed_shade_stops))
 
-# Plot the first graph visualizing optimal shade locations against proximity to public service buildings
-possible_shade_locations.plot(ax=axes[0], color='orange', label='{shade_type} Stops', alpha=0.5)
-public_points.plot(ax=axes[0], color='gray', label='Public Facilities', alpha=0.4)
-optimized_shades.plot(ax=axes[0], color='purple', marker='*', markersize=120, alpha = 0.4, label='Optimal Shade Locations')
+print(f"Selected {len(optimized_shades)} optimal shade sites.")
 
-cx.add_basemap(axes[0], source=cx.providers.CartoDB.PositronNoLabels)
-axes[0].legend()
-axes[0].set_title(f"{shade_area} Shade Placement Optimization (MILP) on {shade_type}", fontsize=16)
-axes[0].set_axis_off()
+# candidates (with the priority layer) and public facilities are saved for the render stage
+output_prefix = f"../../data/optimized_shades_{shade_type}_{shade_area}"
+processed_shade_stops.to_parquet(f"{output_prefix}.candidates.parquet")
+public_points.to_parquet(f"{output_prefix}.public.parquet")
 
-# Plot the second graph visualizing heat and socioeconomic priority layers
-processed_shade_stops.plot(
-    ax=axes[1],
-    cmap = 'YlOrRd',
-    column="heat_socio_layer",
-    markersize=50,
-    alpha=0.7
-)
-optimized_shades.plot(ax=axes[1], color='purple', marker='*', markersize=120, alpha=0.4, label='Optimal Shade Locations')
-cx.add_basemap(axes[1], source=cx.providers.CartoDB.PositronNoLabels)
-axes[1].legend()
-axes[1].set_title(f"{shade_area} {shade_type} Stops Colored by Heat + Socioeconomic Layer", fontsize=16)
-axes[1].set_axis_off()
+num_shades = str(len(optimized_shades))
+if not sweep_shade_counts:
+    output_path = f"{output_prefix}_{num_shades}.geojson"
+    with recorder.stage("save"):
+        optimized_shades.to_file(output_path, driver="GeoJSON")
+    print(f"Saved {len(optimized_shades)} optimized shade locations to {output_path}")
+    selections, report_path = [output_path], f"{output_prefix}_{num_shades}.report.json"
+else:
+    selections, report_path = [f"{output_prefix}_{k}.geojson" for k in sorted(sweep_shade_counts)], f"{output_prefix}_sweep.report.json"
 
-plt.tight_layout()
-plt.savefig(f"shade_optimization_images_{shade_type}_{shade_area}_{num_shades}.png", dpi=300, bbox_inches='tight')
+# --- Visualize ---
+# rendering is a separate stage that reads these files:
+#   python ../visualization/render.py <report.json>   (basemap tiles from python ../visualization/tile_cache.py)
+recorder.info["outputs"] = {
+    "selections": [os.path.abspath(path) for path in selections],
+    "candidates": os.path.abspath(f"{output_prefix}.candidates.parquet"),
+    "public": os.path.abspath(f"{output_prefix}.public.parquet"),
+}
+recorder.write(report_path)
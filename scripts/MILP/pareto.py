@@ -0,0 +1,206 @@
+"""
+Trade-off exploration over the objective weights.
+
+    python pareto.py --max-shades 30 --steps 4
+    python pareto.py --max-shades 30 --epsilon socioeconomic --epsilon-steps 6 --workers 8
+
+Every point of the exploration is one solve of the same prepared problem:
+- weight vectors: the public / heat / socioeconomic weights spread over a simplex
+  grid (same total as the defaults), optionally for several spacing weights
+- epsilon constraints: the default objective with the chosen term bounded from
+  below, from its value in the default solution up to its maximum
+The sparse constraint matrix is built once (MILP.backends) and handed to the
+worker processes at start-up; each solve only swaps the objective vector (and adds
+the epsilon row). Duplicate and dominated selections are dropped, and the
+non-dominated frontier is returned with the unweighted score of every term.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from MILP.backends import build_shade_matrices, solve_highs
+from MILP.distance_optimizer import SPACING_WEIGHT, PUBLIC_WEIGHT, HEAT_WEIGHT, SOCIOECONOMIC_WEIGHT
+
+TERMS = ("spacing", "public", "heat", "socioeconomic")
+DEFAULT_WEIGHTS = {"spacing": SPACING_WEIGHT, "public": PUBLIC_WEIGHT, "heat": HEAT_WEIGHT, "socioeconomic": SOCIOECONOMIC_WEIGHT}
+
+
+def weight_grid(steps=4, spacing_weights=(SPACING_WEIGHT,), total=PUBLIC_WEIGHT + HEAT_WEIGHT + SOCIOECONOMIC_WEIGHT):
+    """
+    Weight vectors with the public / heat / socioeconomic weights on a simplex grid
+    (each a multiple of total / steps, summing to total), for every spacing weight.
+    """
+    grid = []
+    for spacing in spacing_weights:
+        for public, heat in itertools.product(range(steps + 1), repeat=2):
+            if public + heat <= steps:
+                grid.append({
+                    "spacing": spacing,
+                    "public": total * public / steps,
+                    "heat": total * heat / steps,
+                    "socioeconomic": total * (steps - public - heat) / steps,
+                })
+    return grid
+
+
+def _term_vector(problem, term):
+    return {"public": problem.public_score, "heat": problem.heat_score, "socioeconomic": problem.socio_score}[term]
+
+
+# set once per worker process by _init_worker
+_problem = _matrices = None
+
+
+def _init_worker(problem, matrices):
+    global _problem, _matrices
+    _problem, _matrices = problem, matrices
+
+
+def _solve_point(point):
+    """Solve one weight vector / epsilon bound over the worker's shared problem and matrices."""
+    start = time.perf_counter()
+    weights, epsilon, time_limit, gap_rel = point["weights"], point.get("epsilon"), point["time_limit"], point["gap_rel"]
+    weighted = _problem.reweighted(**weights)
+    matrices = replace(_matrices, c=-np.concatenate([weighted.linear, weighted.pair_weight]))
+    if epsilon is not None:
+        from scipy.sparse import csr_array, vstack
+        # term score of the selection >= level
+        row = np.concatenate([_term_vector(_problem, epsilon["term"]), np.zeros(matrices.variables - matrices.n)])
+        matrices = replace(
+            matrices,
+            A=vstack([matrices.A, csr_array(row[None, :])], format="csr"),
+            lower=np.append(matrices.lower, epsilon["level"]),
+            upper=np.append(matrices.upper, np.inf),
+        )
+    try:
+        selected_idx, stats = solve_highs(matrices, time_limit=time_limit, gap_rel=gap_rel)
+    except RuntimeError as e:  # e.g. an epsilon bound nothing reaches within the time limit
+        return {**point, "error": str(e), "seconds": time.perf_counter() - start}
+    return {
+        **point,
+        "selected": [int(i) for i in selected_idx],
+        "scores": _problem.term_scores(selected_idx),
+        "objective": _problem.objective(selected_idx),
+        "status": stats["status"],
+        "gap": stats["gap"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def non_dominated(points, tolerance=1e-9):
+    """The points with a distinct selection that no other point beats on every term score (all maximized)."""
+    unique = {}
+    for point in points:
+        if "selected" in point:
+            unique.setdefault(tuple(sorted(point["selected"])), point)
+    candidates = list(unique.values())
+    scores = np.array([[point["scores"][t] for t in TERMS] for point in candidates]).reshape(-1, len(TERMS))
+    frontier = []
+    for k, point in enumerate(candidates):
+        at_least = np.all(scores >= scores[k] - tolerance, axis=1)
+        better = np.any(scores > scores[k] + tolerance, axis=1)
+        if not np.any(at_least & better):
+            frontier.append(point)
+    return frontier
+
+
+def pareto_frontier(problem, max_shades, weights=None, epsilon_term=None, epsilon_steps=5, workers=None, time_limit=None, gap_rel=0.005):
+    """
+    Solve a prepared ShadeProblem for every weight vector in `weights` (a list of dicts
+    over TERMS, default weight_grid()) and, with epsilon_term ("public", "heat" or
+    "socioeconomic"), for epsilon_steps lower bounds on that term, in parallel processes.
+    Every solve uses the HiGHS backend with time_limit / gap_rel.
+    Returns {"points": every solve, "frontier": the non-dominated points, ...}.
+    """
+    if epsilon_term is not None and epsilon_term not in TERMS[1:]:
+        raise ValueError(f"epsilon_term must be one of {TERMS[1:]}, not {epsilon_term!r}")
+    start = time.perf_counter()
+    matrices = build_shade_matrices(problem, max_shades)
+    settings = {"time_limit": time_limit, "gap_rel": gap_rel}
+    points = [{"weights": {**DEFAULT_WEIGHTS, **w}, **settings} for w in (weight_grid() if weights is None else weights)]
+    if any(point["weights"]["spacing"] < 0 for point in points):
+        raise ValueError("Spacing weights must not be negative (the sparse model relies on pair weights <= 0)")
+
+    def is_default(point):
+        return "epsilon" not in point and all(np.isclose(point["weights"][t], DEFAULT_WEIGHTS[t]) for t in TERMS)
+
+    if epsilon_term is not None and not any(is_default(point) for point in points):
+        # the epsilon bounds start from the default solution, solved with the grid
+        points.append({"weights": DEFAULT_WEIGHTS, **settings})
+
+    # fork where available, like decomposition.py; the problem and matrices go to each worker once
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(problem, matrices)) as pool:
+        results = list(pool.map(_solve_point, points))
+
+        if epsilon_term is not None:
+            default = next(result for result in results if is_default(result))
+            if "error" in default:
+                print(f"No epsilon constraints on {epsilon_term}: the default solve failed ({default['error']})")
+            else:
+                # bounds from the term's value in the default solution up to its maximum (the top max_shades scores)
+                low = default["scores"][epsilon_term]
+                high = np.sort(_term_vector(problem, epsilon_term))[::-1][:max_shades].sum()
+                levels = np.linspace(low, high, epsilon_steps + 1)[1:]
+                epsilon_points = [{"weights": DEFAULT_WEIGHTS, "epsilon": {"term": epsilon_term, "level": float(level)}, **settings} for level in levels]
+                results += list(pool.map(_solve_point, epsilon_points))
+
+    frontier = non_dominated(results)
+    print(f"Solved {len(results)} points in {time.perf_counter() - start:.2f} s, {len(frontier)} on the frontier")
+    sys.stdout.flush()
+    return {
+        "max_shades": max_shades,
+        "wall_seconds": time.perf_counter() - start,
+        "points": results,
+        "frontier": sorted(frontier, key=lambda point: [-point["scores"][t] for t in TERMS]),
+    }
+
+
+if __name__ == "__main__":
+    from MILP.cache import ArrayCache
+    from MILP.distance_optimizer import prepare_shade_problem
+    from MILP.inputs import load_candidates_and_facilities, enrich_shade_candidates
+
+    parser = argparse.ArgumentParser(description="Explore the objective trade-offs of shade placement.")
+    parser.add_argument("--max-shades", type=int, default=30)
+    parser.add_argument("--spacing-threshold", type=float, default=500)
+    parser.add_argument("--public-service-threshold", type=float, default=300)
+    parser.add_argument("--steps", type=int, default=4, help="simplex grid divisions of the public / heat / socioeconomic weights")
+    parser.add_argument("--spacing-weights", nargs="+", type=float, default=[SPACING_WEIGHT])
+    parser.add_argument("--epsilon", choices=TERMS[1:], help="also bound this term from below")
+    parser.add_argument("--epsilon-steps", type=int, default=5)
+    parser.add_argument("--time-limit", type=float, default=120)
+    parser.add_argument("--gap-rel", type=float, default=0.005)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--county", action="store_true", help="use the whole county instead of DTLA")
+    parser.add_argument("--major-transit", action="store_true", help="use major transit stops as candidates")
+    parser.add_argument("--output-dir", default=os.path.join(os.path.dirname(__file__), "../../data/pareto"))
+    args = parser.parse_args()
+
+    candidates, public_points = load_candidates_and_facilities(not args.county, args.major_transit)
+    candidates = enrich_shade_candidates(candidates)
+    problem = prepare_shade_problem(candidates, public_points, args.spacing_threshold, args.public_service_threshold, cache=ArrayCache())
+    result = pareto_frontier(
+        problem, args.max_shades,
+        weights=weight_grid(args.steps, args.spacing_weights),
+        epsilon_term=args.epsilon, epsilon_steps=args.epsilon_steps,
+        workers=args.workers, time_limit=args.time_limit, gap_rel=args.gap_rel,
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for k, point in enumerate(result["frontier"]):
+        path = os.path.join(args.output_dir, f"pareto_{k:03d}.geojson")
+        candidates.iloc[point["selected"]].to_file(path, driver="GeoJSON")
+        point["selection"] = os.path.abspath(path)
+    with open(os.path.join(args.output_dir, "pareto_frontier.json"), "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved the frontier to {args.output_dir}")
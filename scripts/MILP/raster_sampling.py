@@ -0,0 +1,99 @@
+import numpy as np
+
+try:
+    import rasterio
+    from rasterio.windows import Window
+except ImportError:  # only needed when sampling a raster heat layer
+    rasterio = None
+
+# largest buffer radius in pixels, larger buffers are clamped (a 256 px disk is ~200k samples per point)
+MAX_BUFFER_PX = 256
+# meters per degree of latitude, and of longitude at the equator
+_METERS_PER_DEGREE_LAT = 110574.0
+_METERS_PER_DEGREE_LON = 111320.0
+
+
+def _disk_offsets(radius_rows, radius_cols):
+    """Pixel (row, col) offsets inside an ellipse with these radii in pixels (just the center for 0)."""
+    if radius_rows <= 0 or radius_cols <= 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    r, c = int(np.floor(radius_rows)), int(np.floor(radius_cols))
+    dy, dx = np.mgrid[-r:r + 1, -c:c + 1]
+    inside = (dy / radius_rows) ** 2 + (dx / radius_cols) ** 2 <= 1
+    return dy[inside], dx[inside]
+
+
+def _pixel_size_meters(src, latitude):
+    """(pixel width, pixel height) of the raster in meters; geographic rasters are scaled at `latitude`."""
+    width, height = abs(src.transform.a), abs(src.transform.e)
+    if src.crs is not None and src.crs.is_geographic:
+        return width * _METERS_PER_DEGREE_LON * np.cos(np.radians(latitude)), height * _METERS_PER_DEGREE_LAT
+    factor = 1.0
+    if src.crs is not None:
+        try:
+            factor = src.crs.linear_units_factor[1]
+        except Exception:  # CRS without linear units metadata, assume meters
+            pass
+    return width * factor, height * factor
+
+
+def sample_raster(candidates, raster_path, buffer=0.0, band=1):
+    """
+    Sample a raster (e.g. the ECOSTRESS land-surface-temperature GeoTIFF) at every candidate in one batch.
+    - buffer=0: value of the pixel under each point
+    - buffer>0: mean of the pixels within `buffer` meters of each point, whatever the raster CRS
+      (geographic rasters are converted at the candidates' mean latitude); the radius is
+      clamped to MAX_BUFFER_PX pixels
+    Only the raster blocks (tiles) that hold candidates are read, with a halo wide enough
+    for the buffer, so the county raster is never loaded whole.
+    Nodata pixels and points outside the raster give NaN.
+    """
+    if rasterio is None:
+        raise ImportError("rasterio is required to sample raster layers (pip install rasterio)")
+
+    values = np.full(len(candidates), np.nan)
+    if len(candidates) == 0:
+        return values
+
+    with rasterio.open(raster_path) as src:
+        points = candidates.to_crs(src.crs) if candidates.crs is not None and src.crs is not None else candidates
+        xs, ys = points.geometry.x.to_numpy(), points.geometry.y.to_numpy()
+        rows, cols = rasterio.transform.rowcol(src.transform, xs, ys)
+        rows, cols = np.asarray(rows), np.asarray(cols)
+
+        radius_rows = radius_cols = 0.0
+        if buffer:
+            latitude = np.nanmean(ys) if src.crs is not None and src.crs.is_geographic else 0.0
+            pixel_width, pixel_height = _pixel_size_meters(src, latitude)
+            radius_rows, radius_cols = buffer / pixel_height, buffer / pixel_width
+            if max(radius_rows, radius_cols) > MAX_BUFFER_PX:
+                print(f"⚠️ A {buffer} m buffer is {max(radius_rows, radius_cols):.0f} pixels, clamped to {MAX_BUFFER_PX}")
+                radius_rows, radius_cols = min(radius_rows, MAX_BUFFER_PX), min(radius_cols, MAX_BUFFER_PX)
+        dy, dx = _disk_offsets(radius_rows, radius_cols)
+        halo = int(max(np.abs(dy).max(), np.abs(dx).max()))
+        block_h, block_w = src.block_shapes[band - 1]
+
+        inside = (rows >= -halo) & (rows < src.height + halo) & (cols >= -halo) & (cols < src.width + halo)
+        block_id = (rows // block_h) * ((src.width + block_w - 1) // block_w) + cols // block_w
+
+        for block in np.unique(block_id[inside]):
+            idx = np.flatnonzero(inside & (block_id == block))
+            # read only this block (plus halo) for the points that fall in it
+            row0 = max(int(rows[idx].min()) - halo, 0)
+            col0 = max(int(cols[idx].min()) - halo, 0)
+            row1 = min(int(rows[idx].max()) + halo + 1, src.height)
+            col1 = min(int(cols[idx].max()) + halo + 1, src.width)
+            if row1 <= row0 or col1 <= col0:
+                continue
+            data = src.read(band, window=Window(col0, row0, col1 - col0, row1 - row0), masked=True)
+            data = np.ma.filled(data.astype(np.float64), np.nan)
+
+            r = rows[idx][:, None] + dy[None, :] - row0
+            c = cols[idx][:, None] + dx[None, :] - col0
+            valid = (r >= 0) & (r < data.shape[0]) & (c >= 0) & (c < data.shape[1])
+            samples = np.where(valid, data[np.clip(r, 0, data.shape[0] - 1), np.clip(c, 0, data.shape[1] - 1)], np.nan)
+            with np.errstate(invalid="ignore"):
+                counts = np.sum(~np.isnan(samples), axis=1)
+                values[idx] = np.where(counts > 0, np.nansum(samples, axis=1) / np.maximum(counts, 1), np.nan)
+
+    return values
@@ -0,0 +1,205 @@
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from MILP.distance_optimizer import SPACING_WEIGHT
+from MILP.distances import radius_neighbors, radius_pairs
+
+
+@dataclass
+class ShadeReduction:
+    """
+    A ShadeProblem shrunk for the MILP:
+    - problem: the reduced ShadeProblem over the representatives
+    - representatives: original index of every reduced candidate
+    - labels: for every original candidate, the reduced candidate whose cluster it
+      belongs to, or -1 when its cluster was pruned as dominated
+    """
+    problem: "ShadeProblem"
+    representatives: np.ndarray
+    labels: np.ndarray
+    merge_radius: float
+    stats: dict = field(default_factory=dict)
+
+    def members(self, c):
+        """Original indices of the candidates merged into reduced candidate c."""
+        return np.flatnonzero(self.labels == c)
+
+    def expand(self, reduced_idx):
+        """Original indices of the representatives of a reduced selection."""
+        return [int(self.representatives[c]) for c in reduced_idx]
+
+
+def cluster_candidates(problem, merge_radius):
+    """
+    Leader clustering: in order of decreasing reward (problem.linear) every candidate
+    not yet assigned becomes a representative and absorbs the unassigned candidates
+    within merge_radius of it. Every representative therefore has the highest reward
+    of its cluster and lies within merge_radius of each member.
+    Returns (representatives, labels) with labels indexing into representatives.
+    """
+    n = problem.n
+    rows, cols, _ = radius_neighbors(problem.candidate_coords, problem.candidate_coords, merge_radius)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    labels = np.full(n, -1, dtype=np.int64)
+    representatives = []
+    # stable sort, so equal rewards keep the input order
+    for i in np.argsort(-problem.linear, kind="stable").tolist():
+        if labels[i] >= 0:
+            continue
+        near = cols[indptr[i]:indptr[i + 1]]
+        labels[near[labels[near] < 0]] = len(representatives)
+        labels[i] = len(representatives)
+        representatives.append(i)
+    return np.asarray(representatives, dtype=np.int64), labels
+
+
+def dominated_candidates(problem, dominance_radius):
+    """
+    Candidates j with a dominating candidate i within dominance_radius: i has at least
+    j's reward and, for every other candidate k, a spacing penalty to k no worse
+    than j's (w_ik >= w_jk, 0 when not a close pair). Swapping j for i never lowers the
+    objective of a selection that contains j but not i, so dropping j (its dominating
+    candidate stays) costs nothing unless every optimal selection contains both i and j.
+    Then the selection has to give up j and the loss is not bounded here; with
+    i and j this close their pair penalty is near -SPACING_WEIGHT, so that is rare.
+    Ties are broken by index, so of two identical candidates only one is dropped.
+    """
+    n = problem.n
+    pair_i, pair_j, _ = radius_pairs(problem.candidate_coords, dominance_radius)
+    if not len(pair_i):
+        return np.zeros(n, dtype=bool)
+
+    # every close pair in both orientations, sorted by (source, neighbor) for lookups
+    src = np.concatenate([problem.pair_i, problem.pair_j])
+    dst = np.concatenate([problem.pair_j, problem.pair_i])
+    weights = np.concatenate([problem.pair_weight, problem.pair_weight])
+    keys = src * n + dst
+    order = np.argsort(keys)
+    keys, dst, weights = keys[order], dst[order], weights[order]
+    indptr = np.searchsorted(keys, np.arange(n + 1) * n)
+
+    def weight(sources, targets):
+        if not len(keys):
+            return np.zeros(len(targets))
+        lookup = sources * n + targets
+        pos = np.minimum(np.searchsorted(keys, lookup), len(keys) - 1)
+        return np.where(keys[pos] == lookup, weights[pos], 0.0)
+
+    # orient every pair as (dominating candidate, dominated candidate)
+    better = (problem.linear[pair_i] > problem.linear[pair_j]) | (
+        (problem.linear[pair_i] == problem.linear[pair_j]) & (pair_i < pair_j))
+    winners = np.where(better, pair_i, pair_j)
+    losers = np.where(better, pair_j, pair_i)
+
+    dominated = np.zeros(n, dtype=bool)
+    # a candidate that dominates another one is kept (dominance through a dropped candidate is not transitive)
+    protected = np.zeros(n, dtype=bool)
+    for i, j in zip(winners.tolist(), losers.tolist()):
+        if dominated[j] or dominated[i] or protected[j]:
+            continue
+        # neighbors of i or j other than the pair itself
+        others = np.union1d(dst[indptr[i]:indptr[i + 1]], dst[indptr[j]:indptr[j + 1]])
+        others = others[(others != i) & (others != j)]
+        if np.all(weight(np.full(len(others), i), others) >= weight(np.full(len(others), j), others)):
+            dominated[j] = True
+            protected[i] = True
+    return dominated
+
+
+def reduce_shade_problem(problem, merge_radius=25, prune_dominated=True, dominance_radius=None, min_candidates=0, max_shades=None):
+    """
+    Shrink a prepared ShadeProblem before building the MILP:
+    1. candidates within merge_radius of a better one (e.g. stops on the corners of
+       one intersection) are merged into it (cluster_candidates)
+    2. representatives dominated by a nearby representative are dropped (dominated_candidates,
+       within dominance_radius, by default 2 * merge_radius), keeping at least min_candidates
+    The reduced problem keeps the scores of each representative, the best member of its
+    cluster, and the close pairs among the representatives. The scores are not summed
+    or averaged over the cluster: one shade is placed at one stop, so the reduced
+    objective of a selection is the true objective of its representatives.
+    Loss: mapping a selection to the representatives never lowers the reward, and each
+    close pair's penalty changes by at most 2 * merge_radius / spacing_threshold * SPACING_WEIGHT,
+    so with max_shades picks the reduced optimum is at most max_shades * (max_shades - 1) / 2
+    times that below the full optimum (stats["max_objective_loss"]). This holds while the full
+    optimum has at most one pick per cluster and needs no pruned candidate (see dominated_candidates).
+    refine_selection recovers part of it by trying every member of the picked clusters.
+    """
+    start = time.perf_counter()
+    representatives, labels = cluster_candidates(problem, merge_radius)
+    clustered = problem.subset(representatives)
+
+    keep = np.arange(len(representatives))
+    pruned = 0
+    if prune_dominated:
+        dominated = dominated_candidates(clustered, dominance_radius or 2 * merge_radius)
+        if len(representatives) - dominated.sum() >= min_candidates:
+            keep = np.flatnonzero(~dominated)
+            pruned = int(dominated.sum())
+
+    # renumber the clusters to the kept representatives
+    remap = np.full(len(representatives), -1, dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+    reduction = ShadeReduction(
+        problem=clustered.subset(keep) if pruned else clustered,
+        representatives=representatives[keep],
+        labels=remap[labels],
+        merge_radius=merge_radius,
+    )
+    max_pair_change = 2 * merge_radius / problem.spacing_threshold * SPACING_WEIGHT
+    reduction.stats = {
+        "candidates": problem.n,
+        "close_pairs": len(problem.pair_i),
+        "clusters": len(representatives),
+        "dominated": pruned,
+        "reduced_candidates": reduction.problem.n,
+        "reduced_close_pairs": len(reduction.problem.pair_i),
+        "max_pair_penalty_change": max_pair_change,
+        "max_objective_loss": max_shades * (max_shades - 1) / 2 * max_pair_change if max_shades else None,
+        "seconds": time.perf_counter() - start,
+    }
+    return reduction
+
+
+def refine_selection(problem, reduction, reduced_idx, max_rounds=5):
+    """
+    Map a selection of the reduced problem back to the original candidates: start from
+    the representatives and move every pick to the member of its cluster with the best
+    gain given the other picks, until no move improves the objective. Returns original indices.
+    """
+    selected = reduction.expand(reduced_idx)
+    mask = np.zeros(problem.n, dtype=bool)
+    mask[selected] = True
+
+    for _ in range(max_rounds):
+        improved = False
+        for slot, c in enumerate(reduced_idx):
+            current = selected[slot]
+            mask[current] = False
+            # gain of each member given the rest of the selection
+            members = reduction.members(c)
+            members = members[~mask[members]]
+            gain = problem.linear + problem.interaction(mask)
+            best = int(members[np.argmax(gain[members])])
+            if best != current and gain[best] > gain[current] + 1e-12:
+                selected[slot] = best
+                improved = True
+            mask[selected[slot]] = True
+        if not improved:
+            break
+    return selected
+
+
+def print_reduction(reduction):
+    stats = reduction.stats
+    print(
+        f"Reduced {stats['candidates']} candidates to {stats['reduced_candidates']} "
+        f"({stats['clusters']} clusters within {reduction.merge_radius} m, {stats['dominated']} dominated), "
+        f"close pairs {stats['close_pairs']} -> {stats['reduced_close_pairs']} in {stats['seconds']:.2f} s"
+        + (f", objective loss at most {stats['max_objective_loss']:.4f}" if stats["max_objective_loss"] is not None else "")
+    )
+    sys.stdout.flush()
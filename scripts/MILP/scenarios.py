@@ -0,0 +1,331 @@
+"""
+Run a grid of shade placement scenarios in parallel over data loaded once.
+
+    python scenarios.py grid.json --workers 8
+    python scenarios.py --max-shades 20 30 50 --spacing 300 500
+
+A grid (JSON) lists the values to cross; every combination is one scenario:
+
+    {
+        "candidate_sets": ["bus_stops", "major_transit_stops"],
+        "areas": ["dtla", "county"],
+        "max_shades": [30, 50],
+        "spacing_thresholds": [300, 500],
+        "public_service_thresholds": [300],
+        "objectives": {"all": {}, "no_socioeconomic": {"use_socioeconomic": false}},
+        "solver": {"backend": "cbc", "time_limit": 600, "gap_rel": 0.005}
+    }
+
+Each (candidate set, area) is loaded and enriched once in the parent. Its
+coordinates and heat / socioeconomic values are placed in shared memory, and the
+worker processes attach to them instead of receiving a pickled copy per scenario.
+The spacing pairs and public coverage are computed once per dataset and threshold
+(in the pool) and shared the same way, so scenarios that only differ in max_shades
+or the objective terms go straight to the solve.
+Every selection is written as a GeoJSON and all runs are listed in one
+scenario_index.json (parameters, objective, metrics, timings and output paths),
+which render.py reads like a run report.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from MILP.distance_optimizer import compute_public_coverage, compute_spacing_pairs, prepare_shade_problem_arrays, solve_shade_problem, solution_metrics
+from MILP.distances import point_coords
+from MILP.heuristic import heuristic_shade_problem
+
+CANDIDATE_SETS = {"bus_stops": "Buses", "major_transit_stops": "Major Transit"}
+AREAS = {"dtla": "DTLA", "county": "LAC"}
+OBJECTIVE_TERMS = ("use_spacing", "use_public", "use_heat", "use_socioeconomic")
+
+# grid entries -> defaults, following main.py
+DEFAULT_GRID = {
+    "candidate_sets": ["bus_stops"],
+    "areas": ["dtla"],
+    "max_shades": [30],
+    "spacing_thresholds": [500],
+    "public_service_thresholds": [300],
+    "objectives": {"all": {}},
+    "solver": {},
+}
+DEFAULT_SOLVER = {
+    "formulation": "sparse",
+    "aggregate_conflicts": False,
+    "warm_start": True,
+    "backend": "cbc",
+    "time_limit": 600,
+    "gap_rel": 0.005,
+}
+
+
+def expand_grid(grid):
+    """Every combination of the grid's values as a list of scenario dicts (with a sequential "id")."""
+    unknown = set(grid) - set(DEFAULT_GRID)
+    if unknown:
+        raise ValueError(f"Unknown grid entries: {sorted(unknown)}")
+    grid = {**DEFAULT_GRID, **grid}
+    for name in grid["candidate_sets"]:
+        if name not in CANDIDATE_SETS:
+            raise ValueError(f"Unknown candidate set {name!r}, expected one of {list(CANDIDATE_SETS)}")
+    for name in grid["areas"]:
+        if name not in AREAS:
+            raise ValueError(f"Unknown area {name!r}, expected one of {list(AREAS)}")
+    for name, toggles in grid["objectives"].items():
+        if set(toggles) - set(OBJECTIVE_TERMS):
+            raise ValueError(f"Objective {name!r} may only set {OBJECTIVE_TERMS}")
+    solver = {**DEFAULT_SOLVER, **grid["solver"]}
+
+    scenarios = []
+    for candidate_set, area, objective, spacing, public, k in itertools.product(
+            grid["candidate_sets"], grid["areas"], grid["objectives"],
+            grid["spacing_thresholds"], grid["public_service_thresholds"], grid["max_shades"]):
+        scenarios.append({
+            "id": f"s{len(scenarios):03d}",
+            "candidate_set": candidate_set,
+            "area": area,
+            "objective_variant": objective,
+            "max_shades": int(k),
+            "spacing_threshold": spacing,
+            "public_service_threshold": public,
+            **{term: True for term in OBJECTIVE_TERMS},
+            **grid["objectives"][objective],
+            **solver,
+        })
+    return scenarios
+
+
+class SharedArrays:
+    """
+    Named numpy arrays copied into shared memory blocks. `spec` is a small picklable
+    description that worker processes pass to attach_shared_arrays for read-only views.
+    Call unlink() in the owning process once the workers are done.
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            # shared memory blocks can not be empty
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def unlink(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+# worker-side attachments, kept open for the life of the worker process
+_attached = {}
+
+
+def attach_shared_arrays(spec):
+    """Read-only views of the arrays described by SharedArrays.spec, attaching each block once per process."""
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        if block_name not in _attached:
+            # workers share the owner's resource tracker, so the block is unlinked once, by SharedArrays.unlink
+            _attached[block_name] = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attached[block_name].buf)
+        array.flags.writeable = False
+        arrays[name] = array
+    return arrays
+
+
+def _prepare_arrays(args):
+    # spacing pairs or public coverage of one dataset at one threshold
+    spec, kind, threshold = args
+    arrays = attach_shared_arrays(spec)
+    if kind == "spacing":
+        return compute_spacing_pairs(arrays["candidate_coords"], threshold)
+    return compute_public_coverage(arrays["candidate_coords"], arrays["public_coords"], threshold)
+
+
+def _run_scenario(args):
+    spec, spacing_spec, coverage_spec, scenario = args
+    start = time.perf_counter()
+    try:
+        arrays = attach_shared_arrays(spec)
+        problem = prepare_shade_problem_arrays(
+            arrays["candidate_coords"], arrays["public_coords"],
+            heat_values=arrays["heat"] if scenario["use_heat"] else None,
+            socioeconomic_values=arrays["socioeconomic"] if scenario["use_socioeconomic"] else None,
+            spacing_threshold=scenario["spacing_threshold"],
+            public_service_threshold=scenario["public_service_threshold"],
+            use_spacing=scenario["use_spacing"],
+            use_public=scenario["use_public"],
+            spacing=attach_shared_arrays(spacing_spec),
+            coverage=attach_shared_arrays(coverage_spec),
+        )
+        k = min(scenario["max_shades"], problem.n)
+        incumbent = heuristic_shade_problem(problem, k) if scenario["warm_start"] and scenario["backend"] == "cbc" else None
+        selected_idx = solve_shade_problem(
+            problem, k,
+            formulation=scenario["formulation"],
+            aggregate_conflicts=scenario["aggregate_conflicts"],
+            threads=1,
+            warm_start=incumbent,
+            backend=scenario["backend"],
+            time_limit=scenario["time_limit"],
+            gap_rel=scenario["gap_rel"],
+        )
+        return {
+            "selected": [int(i) for i in selected_idx],
+            "objective": problem.objective(selected_idx),
+            "metrics": solution_metrics(problem, selected_idx),
+            "seconds": time.perf_counter() - start,
+        }
+    except Exception as e:  # one failed scenario should not stop the grid
+        return {"error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - start}
+
+
+def run_scenarios(grid, output_dir, workers=None, load=None):
+    """
+    Solve every scenario of the grid in a process pool and write the selections plus
+    scenario_index.json to output_dir. `load(candidate_set, area)` returns the enriched
+    (candidates, public_points) pair; by default it reads the data store (MILP.inputs).
+    Returns the index dict.
+    """
+    if load is None:
+        from MILP.inputs import load_candidates_and_facilities, enrich_shade_candidates
+
+        def load(candidate_set, area):
+            candidates, public_points = load_candidates_and_facilities(area == "dtla", candidate_set == "major_transit_stops")
+            return enrich_shade_candidates(candidates), public_points
+
+    scenarios = expand_grid(grid)
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    # --- LOAD EACH DATASET ONCE ---
+    datasets, shared = {}, {}
+    try:
+        for candidate_set, area in dict.fromkeys((s["candidate_set"], s["area"]) for s in scenarios):
+            load_start = time.perf_counter()
+            candidates, public_points = load(candidate_set, area)
+            prefix = os.path.join(output_dir, f"optimized_shades_{CANDIDATE_SETS[candidate_set]}_{AREAS[area]}")
+            # saved for the render stage
+            candidates.to_parquet(f"{prefix}.candidates.parquet")
+            public_points.to_parquet(f"{prefix}.public.parquet")
+            shared[(candidate_set, area)] = SharedArrays({
+                "candidate_coords": point_coords(candidates),
+                "public_coords": point_coords(public_points),
+                "heat": candidates["heat_layer"].to_numpy(dtype=np.float64),
+                "socioeconomic": candidates["socioeconomic_layer"].to_numpy(dtype=np.float64),
+            })
+            datasets[(candidate_set, area)] = {
+                "candidates": candidates,
+                "prefix": prefix,
+                "report": {
+                    "candidate_set": candidate_set,
+                    "area": area,
+                    # labels used by render.py, as in main.py's report parameters
+                    "scope": AREAS[area],
+                    "candidates_label": CANDIDATE_SETS[candidate_set],
+                    "candidates": len(candidates),
+                    "public_facilities": len(public_points),
+                    "candidates_path": os.path.abspath(f"{prefix}.candidates.parquet"),
+                    "public_path": os.path.abspath(f"{prefix}.public.parquet"),
+                    "load_seconds": time.perf_counter() - load_start,
+                },
+            }
+            print(f"Loaded {candidate_set} / {area}: {len(candidates)} candidates, {len(public_points)} public facilities")
+            sys.stdout.flush()
+
+        # fork where available, like decomposition.py; the workers attach to the shared blocks either way
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # --- PRECOMPUTE SPACING PAIRS AND COVERAGE ONCE PER DATASET AND THRESHOLD ---
+            prepare_start = time.perf_counter()
+            prepared_keys = list(dict.fromkeys(
+                key for s in scenarios for key in (
+                    (s["candidate_set"], s["area"], "spacing", s["spacing_threshold"]),
+                    (s["candidate_set"], s["area"], "coverage", s["public_service_threshold"]),
+                )
+            ))
+            prepared_jobs = [(shared[(candidate_set, area)].spec, kind, threshold) for candidate_set, area, kind, threshold in prepared_keys]
+            for key, prepared_arrays in zip(prepared_keys, pool.map(_prepare_arrays, prepared_jobs)):
+                shared[key] = SharedArrays(prepared_arrays)
+            prepare_seconds = time.perf_counter() - prepare_start
+            print(f"Prepared {len(prepared_keys)} spacing / coverage arrays in {prepare_seconds:.2f} s")
+            sys.stdout.flush()
+
+            # --- SOLVE SCENARIOS ---
+            results = {}
+            jobs = {
+                s["id"]: (
+                    shared[(s["candidate_set"], s["area"])].spec,
+                    shared[(s["candidate_set"], s["area"], "spacing", s["spacing_threshold"])].spec,
+                    shared[(s["candidate_set"], s["area"], "coverage", s["public_service_threshold"])].spec,
+                    s,
+                )
+                for s in scenarios
+            }
+            futures = {pool.submit(_run_scenario, job): scenario_id for scenario_id, job in jobs.items()}
+            for future in as_completed(futures):
+                scenario_id = futures[future]
+                results[scenario_id] = future.result()
+                status = results[scenario_id].get("error") or f"objective {results[scenario_id]['objective']:.4f}"
+                print(f"[{len(results)}/{len(scenarios)}] {scenario_id}: {status} ({results[scenario_id]['seconds']:.2f} s)")
+                sys.stdout.flush()
+    finally:
+        for arrays in shared.values():
+            arrays.unlink()
+
+    # --- SAVE SELECTIONS AND INDEX ---
+    entries = []
+    for scenario in scenarios:
+        result = dict(results[scenario["id"]])
+        dataset = datasets[(scenario["candidate_set"], scenario["area"])]
+        if "selected" in result:
+            path = f"{dataset['prefix']}_{scenario['max_shades']}_{scenario['id']}.geojson"
+            dataset["candidates"].iloc[result.pop("selected")].to_file(path, driver="GeoJSON")
+            result["selection"] = os.path.abspath(path)
+        entries.append({**scenario, **result})
+
+    index = {
+        "grid": {**DEFAULT_GRID, **grid},
+        "workers": workers,
+        "wall_seconds": time.perf_counter() - start,
+        "prepare_seconds": prepare_seconds,
+        "datasets": [dataset["report"] for dataset in datasets.values()],
+        "scenarios": entries,
+    }
+    index_path = os.path.join(output_dir, "scenario_index.json")
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+    print(f"Solved {len(entries)} scenarios in {index['wall_seconds']:.2f} s, index saved to {index_path}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a grid of shade placement scenarios in parallel.")
+    parser.add_argument("grid", nargs="?", help="scenario grid JSON (see the module docstring)")
+    parser.add_argument("--max-shades", nargs="+", type=int, help="overrides the grid's max_shades")
+    parser.add_argument("--spacing", nargs="+", type=float, help="overrides the grid's spacing_thresholds")
+    parser.add_argument("--output-dir", default=os.path.join(os.path.dirname(__file__), "../../data/scenarios"))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid = json.load(f)
+    if args.max_shades:
+        grid["max_shades"] = args.max_shades
+    if args.spacing:
+        grid["spacing_thresholds"] = args.spacing
+    run_scenarios(grid, args.output_dir, workers=args.workers)
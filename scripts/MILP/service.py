@@ -0,0 +1,241 @@
+"""
+Local optimization service: loads the datasets and precomputed structures once and
+answers what-if questions over HTTP/JSON.
+
+    python service.py                     # DTLA bus stops on http://127.0.0.1:8050
+    python service.py --county --major-transit --port 8051
+
+    curl -X POST localhost:8050/optimize -d '{"max_shades": 40, "use_socioeconomic": false}'
+    curl localhost:8050/health
+
+POST /optimize takes any of optimize_shade_placement's parameters (see PARAMETERS)
+and returns the selected stops as GeoJSON (EPSG:4326) with the objective and metrics.
+Prepared problems are kept per threshold / objective-term combination, so a new
+max_shades only costs the solve, and results are memoized by the canonical request,
+so a repeated question is answered from memory. A solve cut short by its time limit
+is returned but not memoized, so asking again gives the solver another try.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from MILP.cache import ArrayCache
+from MILP.distance_optimizer import prepare_shade_problem, solve_shade_problem, solution_metrics
+from MILP.heuristic import heuristic_shade_problem
+
+# request parameter -> (type, default); defaults follow main.py, except that every solve is bounded (time_limit, gap_rel)
+PARAMETERS = {
+    "max_shades": (int, 30),
+    "spacing_threshold": (float, 500),
+    "public_service_threshold": (float, 300),
+    "use_spacing": (bool, True),
+    "use_public": (bool, True),
+    "use_heat": (bool, True),
+    "use_socioeconomic": (bool, True),
+    "formulation": (str, "sparse"),
+    "aggregate_conflicts": (bool, False),
+    "warm_start": (bool, True),
+    "backend": (str, "cbc"),
+    "time_limit": (float, 600),
+    "gap_rel": (float, 0.005),
+}
+_TYPE_NAMES = {int: "an integer", float: "a number", str: "a string"}
+# parameters that may be null (no limit); every other parameter needs a value
+NULLABLE_PARAMETERS = ("time_limit", "gap_rel")
+CHOICES = {"formulation": ("sparse", "dense"), "backend": ("cbc", "highs")}
+# parameters that change the prepared problem (the rest only change the solve)
+PROBLEM_PARAMETERS = ("spacing_threshold", "public_service_threshold", "use_spacing", "use_public", "use_heat", "use_socioeconomic")
+
+
+def canonicalize(params):
+    """Fill in defaults and coerce types so equivalent requests share one memo key. Raises ValueError on bad input."""
+    unknown = set(params) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    canonical = {}
+    for name, (kind, default) in PARAMETERS.items():
+        value = params.get(name, default)
+        if value is None:
+            if name not in NULLABLE_PARAMETERS:
+                raise ValueError(f"{name} must not be null")
+            canonical[name] = None
+        elif kind is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+            canonical[name] = value
+        elif kind is str:
+            if not isinstance(value, str):
+                raise ValueError(f"{name} must be {_TYPE_NAMES[kind]}")
+            canonical[name] = value
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be {_TYPE_NAMES[kind]}")
+            # "nan" / "inf" parse as floats; 3.7 is not silently truncated to an integer
+            if isinstance(value, bool) or not math.isfinite(number) or (kind is int and not number.is_integer()):
+                raise ValueError(f"{name} must be {'a finite number' if kind is float else _TYPE_NAMES[kind]}")
+            canonical[name] = int(number) if kind is int else number
+
+    for name, allowed in CHOICES.items():
+        if canonical[name] not in allowed:
+            raise ValueError(f"{name} must be one of {list(allowed)}")
+    if canonical["backend"] == "highs" and canonical["formulation"] != "sparse":
+        raise ValueError("The highs backend only builds the sparse formulation")
+    if canonical["max_shades"] < 1:
+        raise ValueError("max_shades must be at least 1")
+    for name in ("spacing_threshold", "public_service_threshold", "time_limit"):
+        if canonical[name] is not None and canonical[name] <= 0:
+            raise ValueError(f"{name} must be positive")
+    if canonical["gap_rel"] is not None and canonical["gap_rel"] < 0:
+        raise ValueError("gap_rel must not be negative")
+    return canonical
+
+
+class ShadeService:
+    """
+    In-memory optimizer over one candidate / public facility set.
+    - problems: prepared ShadeProblem per PROBLEM_PARAMETERS combination
+    - results: response per canonical request (solves that hit the time limit are not kept)
+    Solves run one at a time; memoized answers are served concurrently.
+    """
+
+    def __init__(self, candidates, public_points, cache=None):
+        self.candidates = candidates
+        self.public_points = public_points
+        self.cache = cache
+        self.problems = {}
+        self.results = {}
+        self.solve_lock = threading.Lock()
+        # selections go out in lon/lat, convert once
+        self.candidates_wgs84 = candidates.to_crs(4326)
+
+    def problem(self, params):
+        key = tuple(params[name] for name in PROBLEM_PARAMETERS)
+        if key not in self.problems:
+            self.problems[key] = prepare_shade_problem(
+                self.candidates, self.public_points,
+                **{name: params[name] for name in PROBLEM_PARAMETERS},
+                cache=self.cache,
+            )
+        return self.problems[key]
+
+    def optimize(self, params):
+        """Response for a request (a dict of PARAMETERS), memoized by its canonical form."""
+        params = canonicalize(params)
+        if params["max_shades"] > len(self.candidates):
+            raise ValueError(f"max_shades must be at most {len(self.candidates)}, the number of candidates")
+        key = json.dumps(params, sort_keys=True)
+        if key in self.results:
+            return {**self.results[key], "cached": True}
+
+        with self.solve_lock:
+            # another request may have solved the same question while this one waited
+            if key in self.results:
+                return {**self.results[key], "cached": True}
+
+            start = time.perf_counter()
+            problem = self.problem(params)
+            incumbent = None
+            if params["warm_start"] and params["backend"] == "cbc":
+                incumbent = heuristic_shade_problem(problem, params["max_shades"])
+            selected_idx, stats = solve_shade_problem(
+                problem, params["max_shades"],
+                formulation=params["formulation"],
+                aggregate_conflicts=params["aggregate_conflicts"],
+                warm_start=incumbent,
+                backend=params["backend"],
+                time_limit=params["time_limit"],
+                gap_rel=params["gap_rel"],
+                return_stats=True,
+            )
+            result = {
+                "parameters": params,
+                "selected": [int(i) for i in selected_idx],
+                "objective": problem.objective(selected_idx),
+                "metrics": solution_metrics(problem, selected_idx),
+                "stopped_early": stats["stopped_early"],
+                "gap": stats["gap"],
+                "solve_seconds": time.perf_counter() - start,
+                "features": json.loads(self.candidates_wgs84.iloc[selected_idx].to_json()),
+            }
+            if not stats["stopped_early"]:
+                self.results[key] = result
+        return {**result, "cached": False}
+
+    def health(self):
+        return {
+            "candidates": len(self.candidates),
+            "public_facilities": len(self.public_points),
+            "prepared_problems": len(self.problems),
+            "memoized_results": len(self.results),
+        }
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/optimize":
+                self._send(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                params = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(params, dict):
+                    raise ValueError("The request body must be a JSON object")
+                self._send(200, service.optimize(params))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:  # keep serving after a failed solve
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    return Handler
+
+
+def serve(service, host="127.0.0.1", port=8050):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving shade optimization on http://{host}:{port}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    from MILP.inputs import load_candidates_and_facilities, enrich_shade_candidates
+
+    parser = argparse.ArgumentParser(description="Serve shade placement optimization over HTTP/JSON.")
+    parser.add_argument("--county", action="store_true", help="use the whole county instead of DTLA")
+    parser.add_argument("--major-transit", action="store_true", help="use major transit stops as candidates")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    candidates, public_points = load_candidates_and_facilities(not args.county, args.major_transit)
+    candidates = enrich_shade_candidates(candidates)
+    print(f"Loaded {len(candidates)} candidates and {len(public_points)} public facilities in {time.perf_counter() - start:.2f} s")
+    serve(ShadeService(candidates, public_points, cache=ArrayCache()), args.host, args.port)
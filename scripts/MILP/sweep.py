@@ -0,0 +1,93 @@
+import itertools
+import json
+import os
+import sys
+import time
+
+from MILP.distance_optimizer import prepare_shade_problem, build_shade_model, set_warm_start
+from MILP.heuristic import lazy_greedy, swap_local_search
+from MILP.instrumentation import solve_cbc
+
+
+def sweep_max_shades(candidate_points, public_points, shade_counts, spacing_thresholds=(300,), public_service_thresholds=(300,), use_spacing=True, use_public=True, use_heat=True, use_socioeconomic=True, formulation="sparse", aggregate_conflicts=False, output_dir=None, name_prefix="optimized_shades", msg=False, cache=None, time_limit=None, gap_rel=None, threads=None):
+    """
+    Solve optimize_shade_placement for several max_shades values (and optionally
+    several spacing / public thresholds) in one pass:
+    - the problem data and PuLP model are built once per threshold combination
+    - only the right-hand side of the max_shades constraint changes between solves
+    - each solve is warm-started from the previous selection, extended greedily to the new count
+    time_limit (seconds, per solve), gap_rel and threads bound every solve like in
+    optimize_shade_placement; each summary entry records CBC's result and gap, so a solve
+    stopped on the time limit is not mistaken for a proven optimum. A solve without a
+    feasible selection raises RuntimeError.
+    With output_dir set, every selection is written as {name_prefix}_{k}.geojson
+    (thresholds are added to the name when more than one is swept) plus a {name_prefix}_sweep_summary.json.
+    Returns {(spacing_threshold, public_service_threshold, max_shades): selected candidate_points}.
+    """
+    results = {}
+    summary = []
+    multiple_thresholds = len(spacing_thresholds) * len(public_service_thresholds) > 1
+
+    for spacing_threshold, public_service_threshold in itertools.product(spacing_thresholds, public_service_thresholds):
+        start = time.perf_counter()
+        problem = prepare_shade_problem(
+            candidate_points, public_points,
+            spacing_threshold=spacing_threshold,
+            public_service_threshold=public_service_threshold,
+            use_spacing=use_spacing,
+            use_public=use_public,
+            use_heat=use_heat,
+            use_socioeconomic=use_socioeconomic,
+            cache=cache,
+        )
+        model, x, y = build_shade_model(problem, max(shade_counts), formulation=formulation, aggregate_conflicts=aggregate_conflicts)
+        cardinality = model.constraints["max_shades"]
+        print(f"Built model for spacing={spacing_threshold}, public={public_service_threshold} in {time.perf_counter() - start:.2f} s")
+        sys.stdout.flush()
+
+        previous = []
+        for k in sorted(shade_counts):
+            solve_start = time.perf_counter()
+            # the model was built for the largest count, so the aggregated conflict constraints' big-M stays valid
+            cardinality.constant = -k
+
+            # warm start: keep the previous shades (when they fit) and fill up greedily
+            keep = previous if len(previous) <= k else []
+            incumbent = swap_local_search(problem, lazy_greedy(problem, k, fixed_in=keep))
+            set_warm_start(x, y, incumbent)
+
+            stats = solve_cbc(model, msg=msg, threads=threads, warmStart=True, timeLimit=time_limit, gapRel=gap_rel)
+            # PuLP reports "Optimal" for any stop with a solution (including the time limit)
+            if stats["status"] != "Optimal":
+                raise RuntimeError(f"CBC found no feasible selection for max_shades={k} ({stats['status']}: {stats['result']})")
+            selected_idx = [i for i in range(problem.n) if x[i].value() > 0.5]
+            previous = selected_idx
+
+            selected = candidate_points.iloc[selected_idx]
+            results[(spacing_threshold, public_service_threshold, k)] = selected
+            entry = {
+                "spacing_threshold": spacing_threshold,
+                "public_service_threshold": public_service_threshold,
+                "max_shades": k,
+                "objective": problem.objective(selected_idx),
+                "warm_start_objective": problem.objective(incumbent),
+                "result": stats["result"],
+                "gap": stats["gap"],
+                "solve_time": time.perf_counter() - solve_start,
+            }
+
+            if output_dir is not None:
+                suffix = f"_s{spacing_threshold}_p{public_service_threshold}" if multiple_thresholds else ""
+                path = os.path.join(output_dir, f"{name_prefix}{suffix}_{k}.geojson")
+                selected.to_file(path, driver="GeoJSON")
+                entry["path"] = path
+
+            summary.append(entry)
+            print(f"max_shades={k}: objective {entry['objective']:.6f} (warm start {entry['warm_start_objective']:.6f}) in {entry['solve_time']:.2f} s, {entry['result']}")
+            sys.stdout.flush()
+
+    if output_dir is not None:
+        with open(os.path.join(output_dir, f"{name_prefix}_sweep_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return results
@@ -0,0 +1,166 @@
+"""
+Benchmark the shade optimization pipeline across problem sizes.
+
+    python benchmark_pipeline.py
+    python benchmark_pipeline.py --sizes 100 1000 5000 20000 --solve-max-n 5000
+
+Every phase (distance precompute, coverage scoring, PuLP and matrix-form
+model construction, solve, post-solve metrics) is timed and memory-profiled
+separately on synthetic instances clustered like the DTLA bus stops. Each run appends
+one JSON line per size to data/benchmarks/history.jsonl (not tracked), tagged with the
+git commit. The solve status is CBC's own result, e.g. "Stopped on time limit" rather
+than PuLP's "Optimal" for a solve cut short.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import geopandas as gpd
+import numpy as np
+import pulp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from MILP.distance_optimizer import compute_spacing_pairs, compute_public_coverage, prepare_shade_problem, build_shade_model, solution_metrics
+from MILP.distances import point_coords
+from MILP.backends import build_shade_matrices
+from MILP.instrumentation import solve_cbc
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/benchmarks/history.jsonl")
+
+# DTLA has ~675 bus stops in ~31 km² and ~100 public facilities
+STOPS_PER_KM2 = 22
+FACILITIES_PER_STOP = 0.15
+
+
+def generate_instance(n_candidates, n_facilities=None, seed=0):
+    """
+    Synthetic candidates / facilities in EPSG:3857 with DTLA-like structure:
+    stops sit at intersections of a jittered street grid, often as near-duplicate
+    clusters (opposite corners, several lines at one curb), and facilities
+    follow the same density. Heat and socioeconomic values vary smoothly in space.
+    """
+    rng = np.random.default_rng(seed)
+    n_facilities = n_facilities or max(10, int(n_candidates * FACILITIES_PER_STOP))
+    side = np.sqrt(n_candidates / STOPS_PER_KM2) * 1000
+
+    # intersections on a ~250 m street grid, each holding a small cluster of stops
+    block = 250
+    n_clusters = max(1, n_candidates // 3)
+    centers = rng.integers(0, max(1, int(side // block)), size=(n_clusters, 2)) * block + rng.normal(0, 20, (n_clusters, 2))
+    sizes = rng.multinomial(n_candidates - n_clusters, np.ones(n_clusters) / n_clusters) + 1
+    candidates = np.repeat(centers, sizes, axis=0) + rng.normal(0, 25, (n_candidates, 2))
+    facilities = centers[rng.integers(0, n_clusters, n_facilities)] + rng.normal(0, 150, (n_facilities, 2))
+
+    origin = np.array([-13168000.0, 4030000.0])   # downtown Los Angeles
+    candidates, facilities = candidates + origin, facilities + origin
+
+    # smooth fields: a few gaussian bumps over the study area
+    bumps = rng.uniform(0, side, (5, 2)) + origin
+    def field(points):
+        d2 = ((points[:, None, :] - bumps[None, :, :]) ** 2).sum(axis=2)
+        return np.exp(-d2 / (2 * (side / 4) ** 2)).sum(axis=1)
+
+    candidate_points = gpd.GeoDataFrame(
+        {"heat_layer": 30 + 10 * field(candidates), "socioeconomic_layer": field(candidates[:, ::-1])},
+        geometry=gpd.points_from_xy(candidates[:, 0], candidates[:, 1]), crs=3857,
+    )
+    public_points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(facilities[:, 0], facilities[:, 1]), crs=3857)
+    return candidate_points, public_points
+
+
+def _measure(phases, name, func, memory=True):
+    """
+    Record the wall time of func under phases[name] and, with memory=True, the peak
+    traced (Python / NumPy) memory from a second run, since tracing slows the code down.
+    """
+    start = time.perf_counter()
+    result = func()
+    phases[name] = {"seconds": time.perf_counter() - start, "peak_mb": None}
+    if memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        phases[name]["peak_mb"] = peak / 1024 ** 2
+    return result
+
+
+def benchmark_size(n, max_shades=None, spacing_threshold=500, public_service_threshold=300, solve=True, solve_time_limit=120, memory=True, seed=0):
+    # default to the DTLA ratio of 30 shades for ~675 stops
+    max_shades = max_shades or max(5, round(n / 22))
+    candidate_points, public_points = generate_instance(n, seed=seed)
+    candidate_coords, public_coords = point_coords(candidate_points), point_coords(public_points)
+    phases = {}
+
+    _measure(phases, "distance_precompute", lambda: compute_spacing_pairs(candidate_coords, spacing_threshold), memory)
+    _measure(phases, "coverage_scoring", lambda: compute_public_coverage(candidate_coords, public_coords, public_service_threshold), memory)
+
+    problem = prepare_shade_problem(candidate_points, public_points, spacing_threshold, public_service_threshold)
+    model, x, y = _measure(phases, "model_construction", lambda: build_shade_model(problem, max_shades), memory)
+    _measure(phases, "matrix_construction", lambda: build_shade_matrices(problem, max_shades), memory)
+
+    result = {
+        "n": n,
+        "p": len(public_points),
+        "max_shades": max_shades,
+        "close_pairs": int(len(problem.pair_i)),
+        "variables": len(x) + len(y),
+        "constraints": len(model.constraints),
+        "phases": phases,
+    }
+
+    if solve:
+        # CBC runs in a subprocess, its memory is not traced
+        stats = _measure(phases, "solve", lambda: solve_cbc(model, timeLimit=solve_time_limit), memory=False)
+        selected_idx = [i for i in range(problem.n) if x[i].value() > 0.5]
+        # PuLP reports a solve stopped on the time limit as "Optimal"
+        result["status"] = stats["result"] or stats["status"]
+        result["gap"] = stats["gap"]
+        result["objective"] = problem.objective(selected_idx)
+        result["metrics"] = _measure(phases, "post_solve_metrics", lambda: solution_metrics(problem, selected_idx), memory)
+
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the shade optimization pipeline.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 500, 1000, 5000, 20000])
+    parser.add_argument("--max-shades", type=int, default=None, help="default: n / 22, the DTLA ratio")
+    parser.add_argument("--solve-max-n", type=int, default=5000, help="skip the CBC solve above this many candidates")
+    parser.add_argument("--solve-time-limit", type=float, default=120)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced-memory runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=HISTORY_PATH)
+    args = parser.parse_args()
+
+    run = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pulp": pulp.__version__,
+        "machine": platform.machine(),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "a") as history:
+        for n in args.sizes:
+            result = benchmark_size(n, max_shades=args.max_shades, solve=n <= args.solve_max_n, solve_time_limit=args.solve_time_limit, memory=not args.no_memory, seed=args.seed)
+            history.write(json.dumps({**run, **result}) + "\n")
+            history.flush()
+            timings = ", ".join(f"{name} {phase['seconds']:.3f}s" + (f"/{phase['peak_mb']:.1f}MB" if phase["peak_mb"] is not None else "") for name, phase in result["phases"].items())
+            print(f"n={n}: {timings}")
+            sys.stdout.flush()
@@ -0,0 +1,157 @@
+"""
+Polygon layer preparation: clip the county-wide tract / block-group layers to a
+study region and simplify them once, so spatial joins and renders read a fraction
+of the vertices.
+
+    python layers.py --region dtla
+    python layers.py --region la --tolerance 10 --layers below_poverty social_sensitivity
+
+Each layer is read with the region bbox pushed down into the reader, reprojected to
+the working CRS (EPSG:3857), clipped to the region and simplified to `tolerance`
+meters with shapely.coverage_simplify, which moves the edge shared by two adjacent
+polygons once, so neighbors keep a common boundary without gaps or overlaps.
+The result goes into the GeoParquet store as <layer>_<region>.parquet, rows in
+Hilbert order with a bbox covering column (spatial filter pushdown, precomputed bounds),
+next to a <layer>_<region>.json recording the source, settings and vertex counts.
+A layer is only prepared again when its source or the settings change.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from regions import REGIONS, region_bbox
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(os.path.join(REPO_ROOT, "scripts"))
+from MILP.data_store import STORE_DIR, WORKING_CRS
+
+DEFAULT_TOLERANCE = 5.0  # meters
+
+# layer -> source file (relative to the repo root)
+POLYGON_LAYERS = {
+    "below_poverty": "data/raw/Below_Poverty_tract.geojson",
+    "social_sensitivity": "461/data/social_sensitivity.geojson",
+    "excess_er": "461/data/la_excess_er.geojson",
+    "heat_layer": "data/layers/heat_layer.geojson",
+    "socioeconomic_layer": "data/layers/socioeconomic_layer.geojson",
+}
+
+
+def prepared_path(layer, region_name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{layer}_{region_name}.parquet")
+
+
+def _region_box(bbox):
+    """The lat/lon bbox as an EPSG:3857 rectangle (web mercator keeps it axis-aligned)."""
+    to_mercator = Transformer.from_crs(4326, WORKING_CRS, always_xy=True)
+    (x0, x1), (y0, y1) = to_mercator.transform([bbox[0], bbox[2]], [bbox[1], bbox[3]])
+    return x0, y0, x1, y1
+
+
+def _simplify(geoms, tolerance):
+    if hasattr(shapely, "coverage_simplify"):
+        return shapely.coverage_simplify(geoms, tolerance), "coverage_simplify"
+    # shapely < 2.1: per-polygon simplification, shared edges may drift apart by up to tolerance
+    return shapely.simplify(geoms, tolerance, preserve_topology=True), "simplify(preserve_topology=True)"
+
+
+def prepare_layer(layer, region_name, bbox, tolerance=DEFAULT_TOLERANCE, store_dir=STORE_DIR, force=False):
+    """Clip and simplify one polygon layer for a region into the GeoParquet store. Returns a status line."""
+    start = time.perf_counter()
+    source = os.path.join(REPO_ROOT, POLYGON_LAYERS[layer])
+    if not os.path.exists(source):
+        return f"⚠️ {layer}: no source file found ({POLYGON_LAYERS[layer]})"
+
+    output_path = prepared_path(layer, region_name, store_dir)
+    settings_path = os.path.splitext(output_path)[0] + ".json"
+    settings = {
+        "layer": layer,
+        "source": POLYGON_LAYERS[layer],
+        "source_bytes": os.path.getsize(source),
+        "source_mtime": os.path.getmtime(source),
+        "region": region_name,
+        "bbox": list(bbox),
+        "crs": f"EPSG:{WORKING_CRS}",
+        "tolerance": tolerance,
+    }
+    if not force and os.path.exists(output_path) and os.path.exists(settings_path):
+        with open(settings_path, "r") as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in settings} == settings:
+            return f"⏭️ {layer}: {output_path} is up to date"
+
+    # --- READ ---
+    gdf = gpd.read_file(source, bbox=gpd.GeoSeries([shapely.box(*bbox)], crs="EPSG:4326"))
+    if gdf.crs is None:
+        gdf = gdf.set_crs(4326)
+    gdf = gdf.to_crs(WORKING_CRS)
+    vertices_before = int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+    # --- CLIP ---
+    geoms = shapely.make_valid(gdf.geometry.values)
+    geoms = shapely.clip_by_rect(geoms, *_region_box(bbox))
+    keep = ~shapely.is_empty(geoms) & np.isin(shapely.get_type_id(geoms), [3, 6])  # Polygon, MultiPolygon
+    gdf, geoms = gdf[keep].copy(), geoms[keep]
+
+    # --- SIMPLIFY ---
+    geoms, method = _simplify(geoms, tolerance)
+    gdf = gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=WORKING_CRS))
+    gdf = gdf[~gdf.geometry.is_empty]
+
+    # neighboring polygons end up in the same row groups, so bbox filters skip the rest of the file
+    gdf = gdf.iloc[np.argsort(gdf.hilbert_distance())].reset_index(drop=True)
+    os.makedirs(store_dir, exist_ok=True)
+    gdf.to_parquet(output_path, write_covering_bbox=True)
+
+    vertices_after = int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+    with open(settings_path, "w") as f:
+        json.dump({
+            **settings,
+            "method": method,
+            "features": len(gdf),
+            "vertices_before": vertices_before,
+            "vertices_after": vertices_after,
+            "bounds": gdf.total_bounds.tolist(),
+            "shapely": shapely.__version__,
+            "geopandas": gpd.__version__,
+        }, f, indent=2)
+    return (f"✅ {layer}: {len(gdf)} polygons, {vertices_before} → {vertices_after} vertices "
+            f"→ {output_path} ({time.perf_counter() - start:.2f} s)")
+
+
+def prepare_layers(region_name, bbox=None, layers=None, tolerance=DEFAULT_TOLERANCE, store_dir=STORE_DIR, workers=None, force=False):
+    """Prepare the given polygon layers (default: all) for a region, in parallel."""
+    bbox = bbox if bbox is not None else region_bbox(region_name)
+    layers = layers or list(POLYGON_LAYERS)
+
+    print(f"Preparing {len(layers)} polygon layers for '{region_name}' bbox={bbox}, tolerance={tolerance} m")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(prepare_layer, layer, region_name, bbox, tolerance, store_dir, force) for layer in layers]
+        for future in futures:
+            print(future.result())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clip and simplify polygon layers to a study region.")
+    parser.add_argument("--region", default="dtla", help=f"region name ({', '.join(REGIONS)}) or a new name used with --bbox")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"), help="custom lat/lon bounding box")
+    parser.add_argument("--layers", nargs="+", choices=list(POLYGON_LAYERS), help="layers to prepare (default: all)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="simplification tolerance in meters")
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="prepare layers that are already up to date")
+    args = parser.parse_args()
+
+    if args.bbox is None and args.region not in REGIONS:
+        parser.error(f"unknown region '{args.region}', pass --bbox to define it")
+
+    prepare_layers(args.region, bbox=tuple(args.bbox) if args.bbox else None, layers=args.layers, tolerance=args.tolerance, store_dir=args.store_dir, workers=args.workers, force=args.force)
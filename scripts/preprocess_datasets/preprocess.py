@@ -0,0 +1,220 @@
+"""
+Unified preprocessing: filter every raw dataset to a study region in one command.
+
+    python preprocess.py --region dtla
+    python preprocess.py --region my_area --bbox -118.30 34.00 -118.20 34.10 --datasets bus_stops schools
+
+The bbox filter is pushed down into the reader (OGR bbox / attribute filters)
+so only the features inside the region are parsed, geometries are built in a
+vectorized way, and all datasets are processed in parallel.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from regions import REGIONS, region_bbox
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+OUTPUT_DIR = os.path.join(REPO_ROOT, "data/preprocessed")
+
+# --- Raw datasets ---
+# reader:
+# - "vector":  any OGR-readable file, bbox pushed down into the reader
+# - "latlon":  GeoJSON whose points come from lat/lon properties, filtered with an OGR attribute query
+# - "esri":    ArcGIS query output ({"features": [{"attributes": ..., "geometry": ...}]}) with lat/lon attributes
+DATASETS = {
+    "bus_stops": {
+        "inputs": ["461/data/bus_stops.geojson", "461/data/bus_stops/bus_stops.shp"],
+        "reader": "latlon",
+        "lat": "LAT",
+        "lon": "LONG",
+        "output": "bus_stops",
+    },
+    "transit_stops": {
+        "inputs": ["data/raw/la_major_transit_stops.geojson"],
+        "reader": "esri",
+        "lat": "lat",
+        "lon": "lon",
+        "output": "la_major_transit_stops",
+    },
+    "hospitals": {
+        "inputs": ["data/raw/la_hospitals_clinics_live.geojson"],
+        "reader": "esri",
+        "lat": "latitude",
+        "lon": "longitude",
+        "output": "la_hospitals_clinics",
+    },
+    "food_assistance": {
+        "inputs": ["data/raw/la_food_assistance.geojson"],
+        "reader": "vector",
+        "output": "la_food_assistance",
+    },
+    "schools": {
+        "inputs": ["data/raw/la_schools_colleges_universities.geojson"],
+        "reader": "vector",
+        "output": "la_schools",
+    },
+}
+
+
+def _read_vector(path, bbox):
+    # a GeoSeries bbox is reprojected to the file's CRS by the reader
+    gdf = gpd.read_file(path, bbox=gpd.GeoSeries([box(*bbox)], crs="EPSG:4326"))
+    if gdf.crs is None or gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+    return gdf
+
+
+def _read_latlon(path, bbox, lat, lon):
+    minx, miny, maxx, maxy = bbox
+    if path.endswith(".shp"):
+        # the shapefile export only carries point geometries
+        return _read_vector(path, bbox)
+    where = f"{lat} >= {miny} AND {lat} <= {maxy} AND {lon} >= {minx} AND {lon} <= {maxx}"
+    df = gpd.read_file(path, where=where, ignore_geometry=True)
+    return gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df[lon], df[lat]), crs="EPSG:4326")
+
+
+_FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def iter_esri_features(path, chunk_size=1 << 20):
+    """
+    Yield the features of an ArcGIS query dump one at a time, reading the file in
+    chunk_size pieces, so only one chunk plus one feature is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            start = _FEATURES_START.search(buffer)
+            if start:
+                break
+            if not chunk:
+                return
+            buffer = buffer[-64:]  # the key may be split across chunks
+
+        pos = start.end()
+        while True:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                feature, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the feature continues in the next chunk
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"{path}: truncated features array")
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield feature
+
+
+def read_esri_points(path, lat, lon, bbox=None):
+    """
+    Points from an ArcGIS query dump using its lat/lon attributes, optionally filtered to a lat/lon bbox.
+    The dump is streamed and the bbox is applied to every record as it is read, so only
+    the features inside the region are kept.
+    """
+    records, ys, xs = [], [], []
+    for feature in iter_esri_features(path):
+        attributes = feature["attributes"]
+        y, x = attributes.get(lat), attributes.get(lon)
+        y, x = (np.nan if y is None else float(y)), (np.nan if x is None else float(x))
+        if bbox is not None and not (bbox[1] <= y <= bbox[3] and bbox[0] <= x <= bbox[2]):
+            continue
+        records.append(attributes)
+        ys.append(y)
+        xs.append(x)
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        return gpd.GeoDataFrame(df, geometry=[], crs="EPSG:4326")
+    return gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(xs, ys), crs="EPSG:4326")
+
+
+def preprocess_dataset(name, region_name, bbox, output_dir=OUTPUT_DIR, force=False):
+    """
+    Filter one raw dataset to bbox and save it as {output}_{region_name}.geojson. Returns a status line.
+    A {output}_{region_name}.json next to it records the source file and bbox; the output
+    is kept unless force is set or the source or bbox changed (raw files are only
+    rewritten by the retrieval scripts when their content changed).
+    """
+    spec = DATASETS[name]
+    start = time.perf_counter()
+    inputs = [os.path.join(REPO_ROOT, path) for path in spec["inputs"]]
+    path = next((p for p in inputs if os.path.exists(p)), None)
+    if path is None:
+        return f"⚠️ {name}: no raw file found ({', '.join(spec['inputs'])})"
+
+    output_path = os.path.join(output_dir, f"{spec['output']}_{region_name}.geojson")
+    settings_path = os.path.splitext(output_path)[0] + ".json"
+    settings = {
+        "dataset": name,
+        "source": os.path.relpath(path, REPO_ROOT),
+        "source_bytes": os.path.getsize(path),
+        "source_mtime": os.path.getmtime(path),
+        "region": region_name,
+        "bbox": list(bbox),
+    }
+    if not force and os.path.exists(output_path) and os.path.exists(settings_path):
+        with open(settings_path, "r") as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in settings} == settings:
+            return f"⏭️ {name}: {output_path} is up to date"
+
+    if spec["reader"] == "vector":
+        gdf = _read_vector(path, bbox)
+    elif spec["reader"] == "latlon":
+        gdf = _read_latlon(path, bbox, spec["lat"], spec["lon"])
+    elif spec["reader"] == "esri":
+        gdf = read_esri_points(path, spec["lat"], spec["lon"], bbox=bbox)
+    else:
+        raise ValueError(f"Unknown reader: {spec['reader']}")
+
+    gdf.to_file(output_path, driver="GeoJSON")
+    with open(settings_path, "w") as f:
+        json.dump({**settings, "records": len(gdf)}, f, indent=2)
+    return f"✅ {name}: saved {len(gdf)} records to {output_path} ({time.perf_counter() - start:.2f} s)"
+
+
+def preprocess_region(region_name, bbox=None, datasets=None, output_dir=OUTPUT_DIR, workers=None, force=False):
+    """Preprocess the given datasets (default: all) for a region, in parallel."""
+    bbox = bbox if bbox is not None else region_bbox(region_name)
+    datasets = datasets or list(DATASETS)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Preprocessing {len(datasets)} datasets for '{region_name}' bbox={bbox}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(preprocess_dataset, name, region_name, bbox, output_dir, force) for name in datasets]
+        for future in futures:
+            print(future.result())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter raw datasets to a study region.")
+    parser.add_argument("--region", default="dtla", help=f"region name ({', '.join(REGIONS)}) or a new name used with --bbox")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"), help="custom lat/lon bounding box")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), help="datasets to process (default: all)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="reprocess datasets that are already up to date")
+    args = parser.parse_args()
+
+    if args.bbox is None and args.region not in REGIONS:
+        parser.error(f"unknown region '{args.region}', pass --bbox to define it")
+
+    preprocess_region(args.region, bbox=tuple(args.bbox) if args.bbox else None, datasets=args.datasets, output_dir=args.output_dir, workers=args.workers, force=args.force)
@@ -0,0 +1,21 @@
+# Study areas as lat/lon bounding boxes (EPSG:4326)
+REGIONS = {
+    "dtla": {
+        "min_lat": 34.02,
+        "max_lat": 34.08,
+        "min_lon": -118.28,
+        "max_lon": -118.23
+    },
+    "la": {
+        "min_lat": 33.70,
+        "max_lat": 34.82,
+        "min_lon": -118.95,
+        "max_lon": -117.65
+    },
+}
+
+
+def region_bbox(region):
+    """(minx, miny, maxx, maxy) in EPSG:4326 for a region name or a bounds dict like REGIONS["dtla"]."""
+    bounds = REGIONS[region] if isinstance(region, str) else region
+    return (bounds["min_lon"], bounds["min_lat"], bounds["max_lon"], bounds["max_lat"])
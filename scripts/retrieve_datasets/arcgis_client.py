@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter:
+    """Spaces requests at least 1 / requests_per_second apart across all threads."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ArcGISClient:
+    """
+    Concurrent, resumable client for an ArcGIS FeatureServer / MapServer layer query endpoint.
+    - fetches the object-ID list first, then pulls pages of IDs concurrently
+    - shares one rate limit and one pooled HTTP session across the worker threads
+    - streams every page to disk as it arrives and checkpoints finished pages,
+      so an interrupted download resumes where it stopped
+    base_url is the layer's .../query URL, so a local stand-in server works the same way.
+    """
+
+    def __init__(self, base_url, max_workers=4, requests_per_second=3.0, page_size=500, timeout=60, retries=3):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.timeout = timeout
+        self.retries = retries
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def query(self, **params):
+        """POST one query (long objectIds lists do not fit in a URL) with retries and exponential backoff."""
+        params = {"f": "json", **params}
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.post(self.base_url, data=params, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                if "error" in data:
+                    raise RuntimeError(f"ArcGIS error: {data['error']}")
+                return data
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Request failed ({e}), retrying...")
+                time.sleep(2 ** attempt)
+
+    def object_ids(self, where="1=1"):
+        """Return (object id field name, sorted object ids) for the features matching where."""
+        data = self.query(where=where, returnIdsOnly="true")
+        return data.get("objectIdFieldName", "OBJECTID"), sorted(data.get("objectIds") or [])
+
+    def fetch_features(self, object_ids, out_fields="*", return_geometry=True):
+        data = self.query(
+            objectIds=",".join(str(i) for i in object_ids),
+            outFields=out_fields,
+            returnGeometry="true" if return_geometry else "false",
+        )
+        return data.get("features", [])
+
+    def download(self, output_path, where="1=1", out_fields="*"):
+        """
+        Download all features matching where into a FeatureCollection at output_path
+        (same layout as the ArcGIS query output: attributes + geometry per feature).
+        Progress lives in output_path + ".parts.ndjson" / ".checkpoint.json" until the download completes.
+        Returns the number of features written.
+        """
+        parts_path = output_path + ".parts.ndjson"
+        checkpoint_path = output_path + ".checkpoint.json"
+
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+            query = {"where": checkpoint.get("where"), "out_fields": checkpoint.get("out_fields")}
+            if query != {"where": where, "out_fields": out_fields}:
+                raise ValueError(
+                    f"{checkpoint_path} belongs to another query ({query}); "
+                    f"remove it and {parts_path} to start over"
+                )
+            self._trim_partial_line(parts_path)
+            print(f"Resuming download: {len(checkpoint['done'])}/{len(checkpoint['pages'])} pages already fetched")
+        else:
+            id_field, ids = self.object_ids(where)
+            pages = [ids[i:i + self.page_size] for i in range(0, len(ids), self.page_size)]
+            checkpoint = {"where": where, "out_fields": out_fields, "id_field": id_field, "pages": pages, "done": []}
+            if os.path.exists(parts_path):
+                os.remove(parts_path)
+            print(f"Found {len(ids)} features in {len(pages)} pages")
+
+        done = set(checkpoint["done"])
+        todo = [i for i in range(len(checkpoint["pages"])) if i not in done]
+
+        def save_checkpoint():
+            tmp = checkpoint_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp, checkpoint_path)
+
+        save_checkpoint()
+        with open(parts_path, "a") as parts, ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch_features, checkpoint["pages"][i], out_fields): i for i in todo}
+            for future in as_completed(futures):
+                page = futures[future]
+                features = future.result()
+                for feature in features:
+                    parts.write(json.dumps(feature) + "\n")
+                parts.flush()
+                checkpoint["done"].append(page)
+                save_checkpoint()
+                print(f"Fetched page {page} ({len(features)} features), {len(checkpoint['done'])}/{len(checkpoint['pages'])} done")
+
+        count = self._assemble(parts_path, output_path, checkpoint["id_field"])
+        os.remove(parts_path)
+        os.remove(checkpoint_path)
+        return count
+
+    def layer_info(self):
+        """Layer metadata (the URL without /query), or None when the service does not expose it."""
+        try:
+            self.rate_limiter.wait()
+            response = self.session.get(self.base_url.rsplit("/query", 1)[0], params={"f": "json"}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def fetch_many(self, object_ids, out_fields="*", return_geometry=True):
+        """Fetch the given object ids in concurrent pages."""
+        pages = [object_ids[i:i + self.page_size] for i in range(0, len(object_ids), self.page_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            fetch = lambda page: self.fetch_features(page, out_fields, return_geometry)
+            return [feature for features in pool.map(fetch, pages) for feature in features]
+
+    def sync(self, output_path, edit_field=None, where="1=1", out_fields="*", hash_fields=None):
+        """
+        Incrementally update a dataset written by download().
+        A manifest (output_path + ".manifest.json") keeps every object id with its
+        edit timestamp (edit_field) or, for layers without one, a hash of its attributes
+        (hash_fields, default all of them). Hash mode pulls the attributes without
+        geometry to compare them, so a feature that only moved is not picked up;
+        download() refreshes everything.
+        Only added, changed and deleted features are fetched in full, and the dataset is
+        rewritten only when something changed, so downstream steps keyed on the
+        file (preprocessing, GeoParquet store, cached matrices) stay valid otherwise.
+        Without a manifest, an existing dataset is used as the starting point.
+        Returns {"added", "updated", "deleted", "changed"}.
+        """
+        manifest_path = output_path + ".manifest.json"
+        hash_fields = list(hash_fields) if hash_fields else None
+        if not os.path.exists(output_path):
+            count = self.download(output_path, where=where, out_fields=out_fields)
+            with open(output_path, "r") as f:
+                features = json.load(f)["features"]
+            id_field, _ = self.object_ids(where)
+            self._write_manifest(manifest_path, id_field, edit_field, hash_fields, features, self._last_edit_date())
+            print(f"No dataset yet, downloaded all {count} features")
+            return {"added": count, "updated": 0, "deleted": 0, "changed": True}
+
+        manifest = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("edit_field") != edit_field or manifest.get("hash_fields", hash_fields) != hash_fields \
+                    or (not edit_field and manifest.get("hash") != "attributes"):
+                print("Manifest was written with other settings, rebuilding it")
+                manifest = None
+        if manifest is None:
+            # seed from the dataset on disk, so only what differs from it is fetched
+            id_field, _ = self.object_ids(where)
+            with open(output_path, "r") as f:
+                features = json.load(f)["features"]
+            manifest = self._write_manifest(manifest_path, id_field, edit_field, hash_fields, features, None)
+            print(f"Seeded the manifest from the {len(features)} features in {output_path}")
+        id_field = manifest["id_field"]
+
+        # cheap check: the layer's own last edit date did not move
+        last_edit_date = self._last_edit_date()
+        if last_edit_date is not None and last_edit_date == manifest.get("last_edit_date"):
+            print("Layer unchanged since last sync")
+            return {"added": 0, "updated": 0, "deleted": 0, "changed": False}
+
+        known = {int(oid): value for oid, value in manifest["features"].items()}
+        _, remote_ids = self.object_ids(where)
+        remote = set(remote_ids)
+        added = sorted(remote - set(known))
+        deleted = sorted(set(known) - remote)
+
+        if edit_field:
+            since = max(known.values(), default=0)
+            stamp = datetime.fromtimestamp(since / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            _, edited = self.object_ids(f"({where}) AND {edit_field} > timestamp '{stamp}'")
+            edited = sorted(set(edited) & set(known))
+        else:
+            # no edit timestamps: compare attribute hashes, without geometry
+            fields = "*" if hash_fields is None else ",".join(dict.fromkeys([id_field, *hash_fields]))
+            records = self.fetch_many(sorted(remote & set(known)), fields, return_geometry=False)
+            edited = sorted(
+                r["attributes"][id_field] for r in records
+                if known.get(r["attributes"][id_field]) != self._attribute_hash(r, hash_fields)
+            )
+        fetched = self.fetch_many(sorted(set(added) | set(edited)), out_fields)
+        changed = {f["attributes"][id_field]: f for f in fetched}
+        updated = len(set(changed) - set(added))
+
+        if not changed and not deleted:
+            manifest["last_edit_date"] = last_edit_date
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f)
+            print("No feature changes since last sync")
+            return {"added": 0, "updated": 0, "deleted": 0, "changed": False}
+
+        # --- patch the local dataset ---
+        with open(output_path, "r") as f:
+            data = json.load(f)
+        removed = set(deleted) | set(changed)
+        features = [f for f in data["features"] if f["attributes"].get(id_field) not in removed]
+        features.extend(changed[oid] for oid in sorted(changed))
+        data["features"] = features
+
+        tmp = output_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, output_path)
+        self._write_manifest(manifest_path, id_field, edit_field, hash_fields, features, last_edit_date)
+
+        print(f"Synced {output_path}: {len(added)} added, {updated} updated, {len(deleted)} deleted")
+        return {"added": len(added), "updated": updated, "deleted": len(deleted), "changed": True}
+
+    def _last_edit_date(self):
+        info = self.layer_info() or {}
+        return (info.get("editingInfo") or {}).get("lastEditDate")
+
+    @staticmethod
+    def _attribute_hash(feature, hash_fields=None):
+        attributes = feature["attributes"]
+        if hash_fields is not None:
+            attributes = {field: attributes.get(field) for field in hash_fields}
+        return hashlib.sha1(json.dumps(attributes, sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def _write_manifest(cls, manifest_path, id_field, edit_field, hash_fields, features, last_edit_date):
+        manifest = {
+            "id_field": id_field,
+            "edit_field": edit_field,
+            "last_edit_date": last_edit_date,
+            "features": {
+                str(f["attributes"][id_field]): (f["attributes"].get(edit_field) or 0) if edit_field else cls._attribute_hash(f, hash_fields)
+                for f in features
+            },
+        }
+        if not edit_field:
+            manifest.update({"hash": "attributes", "hash_fields": hash_fields})
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    @staticmethod
+    def _trim_partial_line(parts_path):
+        """Cut off a line left half-written by a killed download; its page is not checkpointed, so it is fetched again."""
+        if not os.path.exists(parts_path):
+            return
+        with open(parts_path, "rb+") as parts:
+            size = end = parts.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(end - 65536, 0)
+                parts.seek(start)
+                newline = parts.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                parts.truncate(end)
+                print(f"Dropped an incomplete line at the end of {parts_path}")
+
+    @staticmethod
+    def _assemble(parts_path, output_path, id_field):
+        """Stream the page file into one FeatureCollection, dropping duplicates from interrupted pages."""
+        seen = set()
+        count = 0
+        tmp = output_path + ".tmp"
+        with open(parts_path, "r") as parts, open(tmp, "w") as out:
+            out.write('{"type": "FeatureCollection", "features": [')
+            for line in parts:
+                if not line.endswith("\n"):
+                    # half-written by a killed run; the page was fetched again afterwards
+                    continue
+                feature = json.loads(line)
+                oid = feature.get("attributes", {}).get(id_field)
+                if oid is not None:
+                    if oid in seen:
+                        continue
+                    seen.add(oid)
+                out.write(("," if count else "") + "\n" + line.rstrip("\n"))
+                count += 1
+            out.write("\n]}\n")
+        os.replace(tmp, output_path)
+        return count
@@ -1,46 +1,20 @@
-import requests
-import json
-import time
+import argparse
 
-BASE_URL = "https://public.gis.lacounty.gov/public/rest/services/LACounty_Dynamic/LMS_Data_Public/MapServer/77/query"
-
-params = {
-    "where": "1=1",
-    "outFields": "*",
-    "returnGeometry": "true",
-    "f": "json",
-    "resultOffset": 0,
-    "resultRecordCount": 2000
-}
-
-all_features = []
-batch = 0
+from arcgis_client import ArcGISClient
 
-while True:
-    print(f"Fetching batch {batch} (offset={params['resultOffset']})...")
-    response = requests.get(BASE_URL, params=params)
-    if response.status_code != 200:
-        print("Error:", response.text)
-        break
-
-    data = response.json()
-    features = data.get("features", [])
-    if not features:
-        print("No more data.")
-        break
+BASE_URL = "https://public.gis.lacounty.gov/public/rest/services/LACounty_Dynamic/LMS_Data_Public/MapServer/77/query"
 
-    all_features.extend(features)
-    params["resultOffset"] += params["resultRecordCount"]
-    batch += 1
-    time.sleep(0.3)
+parser = argparse.ArgumentParser(description="Retrieve LA County hospitals and clinics.")
+parser.add_argument("--url", default=BASE_URL, help="layer query URL (e.g. a local stand-in server)")
+parser.add_argument("--sync", action="store_true", help="only apply features added, changed or deleted since the last run")
+args = parser.parse_args()
 
-geojson_data = {
-    "type": "FeatureCollection",
-    "features": all_features
-}
+client = ArcGISClient(args.url, max_workers=4, requests_per_second=3.0)
 
 output_path = "data/la_hospitals_clinics_live.geojson"
-with open(output_path, "w") as f:
-    json.dump(geojson_data, f)
-
-print(f"✅ Saved {len(all_features)} records to {output_path}")
+if args.sync:
+    changes = client.sync(output_path, edit_field="date_updated")
+    print(f"✅ Synced {output_path}: {changes}")
+else:
+    count = client.download(output_path)
+    print(f"✅ Saved {count} records to {output_path}")
@@ -1,56 +1,25 @@
-import requests
-import json
-import time
+import argparse
+
+from arcgis_client import ArcGISClient
 
 # BASE_URL=https://services8.arcgis.com/TNoJFjk1LsD45Juj/ArcGIS/rest/services/Transit_Network-LACMTA%20Stop%20Locations/FeatureServer/0/query 
 BASE_URL = "https://services8.arcgis.com/TNoJFjk1LsD45Juj/arcgis/rest/services/Major_Transit_Stops_By_GTFS/FeatureServer/47/query"
 
-params = {
-    "where": "1=1",           # All features
-    "outFields": "*",         # All attributes
-    "returnGeometry": "true", # Include geometry
-    "f": "json",               # Must use 'json'
-    "resultOffset": 0, # Start index "
-    "resultRecordCount": 2000 # Number of records per batch
-}
-
-all_features = []
-batch = 0
-
-while True:
-    print(f"Fetching batch {batch} (offset={params['resultOffset']})...")
-
-    response = requests.get(BASE_URL, params=params)
-    
-    if response.status_code != 200:
-        print("Error:", response.text)
-        break
+parser = argparse.ArgumentParser(description="Retrieve LA Metro major transit stops.")
+parser.add_argument("--url", default=BASE_URL, help="layer query URL (e.g. a local stand-in server)")
+parser.add_argument("--sync", action="store_true", help="only apply features added, changed or deleted since the last run")
+args = parser.parse_args()
 
-    data = response.json()
-    print("data: ", data)
-    features = data.get("features", [])
-    
-    if not features:
-        print("No more data.")
-        break
-
-    all_features.extend(features)
-    params["resultOffset"] += params["resultRecordCount"]
-    batch += 1
-
-    # Respect ArcGIS rate limits
-    time.sleep(0.3)
-
-# Combine all features into one GeoJSON FeatureCollection
-geojson_data = {
-    "type": "FeatureCollection",
-    "features": all_features
-}
+# Respect ArcGIS rate limits: at most 3 requests per second across all workers
+client = ArcGISClient(args.url, max_workers=4, requests_per_second=3.0)
 
 # Save file
 # output_path = "data/la_metro_stops.geojson"
 output_path = "data/la_major_transit_stops.geojson"
-with open(output_path, "w") as f:
-    json.dump(geojson_data, f)
-
-print(f"✅ Saved {len(all_features)} stops to {output_path}")
+if args.sync:
+    # the layer has no edit timestamps, so changes are detected by attribute hash (no geometry download)
+    changes = client.sync(output_path)
+    print(f"✅ Synced {output_path}: {changes}")
+else:
+    count = client.download(output_path)
+    print(f"✅ Saved {count} stops to {output_path}")
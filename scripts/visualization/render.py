@@ -0,0 +1,158 @@
+"""
+Render the shade placement figures from saved runs, separately from the solver.
+
+    python render.py ../../data/optimized_shades_Buses_DTLA_30.report.json
+    python render.py ../../data/*.report.json --workers 4 --dpi 150
+
+Each run report written by MILP/main.py lists its selection GeoJSON(s) plus the
+candidate and public facility files the run used; a scenario_index.json written by
+MILP/scenarios.py is read the same way, one selection per solved scenario. Every selection becomes one PNG
+next to its GeoJSON, and the figures are rendered in parallel worker processes.
+Basemaps come from the local tile cache (tile_cache.py) only, so rendering works
+offline; without cached tiles the figures are drawn without a basemap.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import matplotlib
+matplotlib.use("Agg")  # use non-interactive backend
+import matplotlib.pyplot as plt
+import numpy as np
+
+from tile_cache import DEFAULT_PROVIDER, TILE_CACHE_DIR, find_cached_basemap, zoom_for_extent
+
+FIGSIZE = (24, 8)
+
+
+def add_cached_basemap(ax, width_px, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """Draw the cached basemap raster under the current EPSG:3857 axis limits. Returns False when none is cached."""
+    (xmin, xmax), (ymin, ymax) = ax.get_xlim(), ax.get_ylim()
+    extent = (xmin, ymin, xmax, ymax)
+    path = find_cached_basemap(extent, zoom_for_extent(extent, width_px), provider, cache_dir)
+    if path is None:
+        print(f"⚠️ No cached {provider} tiles cover this extent (run tile_cache.py), rendering without a basemap")
+        return False
+
+    import rasterio
+    from rasterio.windows import from_bounds, bounds as window_bounds
+
+    with rasterio.open(path) as src:
+        # read only the part of the cached mosaic under the axes
+        window = from_bounds(*extent, transform=src.transform).round_offsets().round_lengths()
+        image = np.moveaxis(src.read(window=window, boundless=True), 0, -1)
+        left, bottom, right, top = window_bounds(window, src.transform)
+    ax.imshow(image, extent=(left, right, bottom, top), interpolation="bilinear", zorder=0)
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    return True
+
+
+def render_selection(job):
+    """Render the two-panel figure for one selection; job is a dict from jobs_from_report."""
+    candidates = gpd.read_parquet(job["candidates"])
+    public_points = gpd.read_parquet(job["public"])
+    optimized_shades = gpd.read_file(job["selection"]).to_crs(candidates.crs)
+    shade_type, shade_area = job["shade_type"], job["shade_area"]
+    panel_width_px = FIGSIZE[0] / 2 * job["dpi"]
+
+    fig, axes = plt.subplots(1, 2, figsize=FIGSIZE)
+
+    # Plot the first graph visualizing optimal shade locations against proximity to public service buildings
+    candidates.plot(ax=axes[0], color='orange', label=f'{shade_type} Stops', alpha=0.5)
+    public_points.plot(ax=axes[0], color='gray', label='Public Facilities', alpha=0.4)
+    optimized_shades.plot(ax=axes[0], color='purple', marker='*', markersize=120, alpha=0.4, label='Optimal Shade Locations')
+    add_cached_basemap(axes[0], panel_width_px, job["provider"], job["cache_dir"])
+    axes[0].legend()
+    axes[0].set_title(f"{shade_area} Shade Placement Optimization (MILP) on {shade_type}", fontsize=16)
+    axes[0].set_axis_off()
+
+    # Plot the second graph visualizing heat and socioeconomic priority layers
+    candidates.plot(
+        ax=axes[1],
+        cmap='YlOrRd',
+        column="heat_socio_layer",
+        markersize=50,
+        alpha=0.7
+    )
+    optimized_shades.plot(ax=axes[1], color='purple', marker='*', markersize=120, alpha=0.4, label='Optimal Shade Locations')
+    add_cached_basemap(axes[1], panel_width_px, job["provider"], job["cache_dir"])
+    axes[1].legend()
+    axes[1].set_title(f"{shade_area} {shade_type} Stops Colored by Heat + Socioeconomic Layer", fontsize=16)
+    axes[1].set_axis_off()
+
+    plt.tight_layout()
+    plt.savefig(job["output"], dpi=job["dpi"], bbox_inches='tight')
+    plt.close(fig)
+    return job["output"]
+
+
+def jobs_from_report(report_path, dpi=150, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """One render job per selection listed in a run report's "outputs"."""
+    with open(report_path, "r") as f:
+        report = json.load(f)
+    if "scenarios" in report:
+        return jobs_from_scenario_index(report, dpi, provider, cache_dir)
+    outputs, parameters = report["outputs"], report.get("parameters", {})
+    return [
+        {
+            "selection": selection,
+            "candidates": outputs["candidates"],
+            "public": outputs["public"],
+            "output": os.path.splitext(selection)[0] + ".png",
+            "shade_type": parameters.get("candidates", ""),
+            "shade_area": parameters.get("scope", ""),
+            "dpi": dpi,
+            "provider": provider,
+            "cache_dir": cache_dir,
+        }
+        for selection in outputs["selections"]
+    ]
+
+
+def jobs_from_scenario_index(index, dpi=150, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """One render job per solved scenario of a scenario_index.json (failed scenarios have no selection)."""
+    datasets = {(dataset["candidate_set"], dataset["area"]): dataset for dataset in index["datasets"]}
+    jobs = []
+    for scenario in index["scenarios"]:
+        if "selection" not in scenario:
+            continue
+        dataset = datasets[(scenario["candidate_set"], scenario["area"])]
+        jobs.append({
+            "selection": scenario["selection"],
+            "candidates": dataset["candidates_path"],
+            "public": dataset["public_path"],
+            "output": os.path.splitext(scenario["selection"])[0] + ".png",
+            "shade_type": dataset.get("candidates_label", ""),
+            "shade_area": dataset.get("scope", ""),
+            "dpi": dpi,
+            "provider": provider,
+            "cache_dir": cache_dir,
+        })
+    return jobs
+
+
+def render_reports(report_paths, workers=None, dpi=150, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """Render every selection of every report, in parallel processes. Returns the PNG paths."""
+    jobs = [job for path in report_paths for job in jobs_from_report(path, dpi, provider, cache_dir)]
+    if workers == 1 or len(jobs) <= 1:
+        return [render_selection(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_selection, jobs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render shade placement figures from saved run reports.")
+    parser.add_argument("reports", nargs="+", help="run reports (*.report.json) written by MILP/main.py, or scenario_index.json from MILP/scenarios.py")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--provider", default=DEFAULT_PROVIDER)
+    parser.add_argument("--cache-dir", default=TILE_CACHE_DIR)
+    args = parser.parse_args()
+
+    for path in render_reports(args.reports, workers=args.workers, dpi=args.dpi, provider=args.provider, cache_dir=args.cache_dir):
+        print(f"Saved {path}")
+        sys.stdout.flush()
@@ -0,0 +1,117 @@
+"""
+Local basemap tile cache for offline rendering.
+
+    python tile_cache.py --region dtla                 # zoom picked from the region size
+    python tile_cache.py --region la --zooms 10 11 12
+
+Tiles are fetched once (with contextily) and mosaicked into one GeoTIFF per
+region, provider and zoom level under data/tiles/, listed in data/tiles/manifest.json.
+render.py only reads these files, so rendering never touches the network.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+TILE_CACHE_DIR = os.path.join(REPO_ROOT, "data/tiles")
+DEFAULT_PROVIDER = "CartoDB.PositronNoLabels"
+
+# half the web mercator world width in meters
+_ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2
+_TILE_SIZE = 256
+_MAX_ZOOM = 19
+
+
+def zoom_for_extent(extent, width_px):
+    """
+    Web mercator zoom level whose tiles give about one tile pixel per output pixel
+    when the EPSG:3857 extent (xmin, ymin, xmax, ymax) is drawn width_px pixels wide.
+    """
+    span = max(extent[2] - extent[0], 1.0)
+    zoom = math.log2(width_px * 2 * _ORIGIN_SHIFT / (_TILE_SIZE * span))
+    return int(min(max(math.ceil(zoom), 0), _MAX_ZOOM))
+
+
+def _manifest_path(cache_dir):
+    return os.path.join(cache_dir, "manifest.json")
+
+
+def load_manifest(cache_dir=TILE_CACHE_DIR):
+    path = _manifest_path(cache_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def seed_tiles(name, extent, zooms, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """
+    Download the provider's tiles over the EPSG:3857 extent at every zoom level
+    and store each zoom as data/tiles/<provider>_<name>_z<zoom>.tif. Needs network access
+    and contextily; existing files are kept.
+    """
+    import contextily as cx
+
+    os.makedirs(cache_dir, exist_ok=True)
+    source = cx.providers.query_name(provider)
+    manifest = load_manifest(cache_dir)
+    for zoom in zooms:
+        filename = f"{provider.replace('.', '_')}_{name}_z{zoom}.tif"
+        path = os.path.join(cache_dir, filename)
+        if not os.path.exists(path):
+            cx.bounds2raster(*extent, path, zoom=zoom, source=source, ll=False)
+            print(f"✅ Cached {provider} zoom {zoom} for {name} → {path}")
+        else:
+            print(f"Already cached: {path}")
+        manifest[filename] = {"provider": provider, "name": name, "zoom": zoom, "extent": list(extent)}
+
+    with open(_manifest_path(cache_dir), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def find_cached_basemap(extent, zoom, provider=DEFAULT_PROVIDER, cache_dir=TILE_CACHE_DIR):
+    """
+    Path of the cached raster that covers the EPSG:3857 extent, preferring the
+    highest zoom not above `zoom` (then the lowest above it), or None when nothing covers it.
+    """
+    covering = [
+        (entry["zoom"], filename) for filename, entry in load_manifest(cache_dir).items()
+        if entry["provider"] == provider
+        and entry["extent"][0] <= extent[0] and entry["extent"][1] <= extent[1]
+        and entry["extent"][2] >= extent[2] and entry["extent"][3] >= extent[3]
+        and os.path.exists(os.path.join(cache_dir, filename))
+    ]
+    if not covering:
+        return None
+    at_or_below = [c for c in covering if c[0] <= zoom]
+    best = max(at_or_below) if at_or_below else min(covering)
+    return os.path.join(cache_dir, best[1])
+
+
+def _region_extent(region, margin=0.05):
+    """EPSG:3857 extent of a study region, padded by `margin` of its size on every side."""
+    from pyproj import Transformer
+    sys.path.append(os.path.join(REPO_ROOT, "scripts"))
+    from preprocess_datasets.regions import region_bbox
+
+    minx, miny, maxx, maxy = region_bbox(region)
+    to_mercator = Transformer.from_crs(4326, 3857, always_xy=True)
+    (x0, x1), (y0, y1) = to_mercator.transform([minx, maxx], [miny, maxy])
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    return (x0 - pad_x, y0 - pad_y, x1 + pad_x, y1 + pad_y)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-seed the local basemap tile cache for a region.")
+    parser.add_argument("--region", default="dtla", help="region name from preprocess_datasets/regions.py")
+    parser.add_argument("--zooms", nargs="+", type=int, help="zoom levels (default: the one render.py picks for the region)")
+    parser.add_argument("--provider", default=DEFAULT_PROVIDER)
+    parser.add_argument("--width-px", type=int, default=1800, help="panel width used to pick the default zoom")
+    parser.add_argument("--cache-dir", default=TILE_CACHE_DIR)
+    args = parser.parse_args()
+
+    extent = _region_extent(args.region)
+    zooms = args.zooms or [zoom_for_extent(extent, args.width_px)]
+    seed_tiles(args.region, extent, zooms, provider=args.provider, cache_dir=args.cache_dir)